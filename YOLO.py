@@ -1,75 +1,284 @@
-import torch
 import json
+import os
+import sys
+import threading
+import time
 from pathlib import Path
-from PIL import Image
-import cv2
+from PIL import Image, ImageOps
 import numpy as np
-import matplotlib.pyplot as plt
 from collections import Counter
+from detection_cache import dhash
+import metrics
+
+# torch, cv2 and matplotlib are imported where they are first needed, so that importing
+# this module (and app.py) stays cheap and the model can be loaded in the background
 
 # Cache the model globally
 CACHED_MODEL = None
+_model_lock = threading.Lock()
+
+# Local yolov5 checkout to load the model definition from (falls back to the torch hub cache)
+YOLOV5_REPO = os.getenv("YOLOV5_REPO", "")
+# Optional exported artifact to run instead of the .pt weights: "torchscript" or "onnx" (needs onnxruntime)
+EXPORT_FORMAT = os.getenv("YOLO_EXPORT_FORMAT", "")
+EXPORT_SUFFIXES = {"torchscript": ".torchscript", "onnx": ".onnx"}
+
+# Input size images are letterboxed to before inference
+INFERENCE_SIZE = 640
+# Longest side uploads are downscaled to right after decoding (the model never sees more than INFERENCE_SIZE)
+MAX_IMAGE_SIDE = int(os.getenv("YOLO_MAX_IMAGE_SIDE", str(INFERENCE_SIZE)))
 
 class YOLOProcessor:
-    def __init__(self, weights_path):
+    def __init__(self, weights_path, cache=None):
         self.weights_path = weights_path
         self.model = None
-        self.results = None
+        # Optional DetectionCache: repeat uploads of the same photo skip inference
+        self.cache = cache
+
+    @staticmethod
+    def _hub_source():
+        """Use a local yolov5 checkout or the torch hub cache when available; GitHub only as a last resort."""
+        import torch
+        hub_cache = os.path.join(torch.hub.get_dir(), "ultralytics_yolov5_master")
+        for repo in (YOLOV5_REPO, hub_cache):
+            if repo and os.path.isfile(os.path.join(repo, "hubconf.py")):
+                return repo, "local"
+        return "ultralytics/yolov5", "github"
+
+    def export_model(self, export_format):
+        """Export the .pt weights once to TorchScript or ONNX next to them and return the new path."""
+        import torch
+        repo, source = self._hub_source()
+        if source != "local":
+            # Download the model definition into the torch hub cache once
+            torch.hub.load(repo, "custom", path=self.weights_path, trust_repo=True)
+            repo, source = self._hub_source()
+        sys.path.insert(0, repo)
+        try:
+            from export import run as export_run  # yolov5/export.py
+            export_run(
+                weights=self.weights_path,
+                include=(export_format,),
+                imgsz=(INFERENCE_SIZE, INFERENCE_SIZE),
+                dynamic=export_format == "onnx",  # Keep the batch dimension free for process_batch
+            )
+        finally:
+            sys.path.remove(repo)
+        return str(Path(self.weights_path).with_suffix(EXPORT_SUFFIXES[export_format]))
 
     def load_model(self):
         """Load the YOLO model."""
         global CACHED_MODEL
         if CACHED_MODEL is None:
-            print(f"Loading model from {self.weights_path} for the first time.")
-            CACHED_MODEL = torch.hub.load("ultralytics/yolov5", "custom", path=self.weights_path, force_reload=True)
-        else:
-            print("Using cached model.")
+            with _model_lock:
+                if CACHED_MODEL is None:
+                    weights = self.weights_path
+                    if EXPORT_FORMAT:
+                        exported = str(Path(self.weights_path).with_suffix(EXPORT_SUFFIXES[EXPORT_FORMAT]))
+                        if not os.path.exists(exported) or os.path.getmtime(exported) < os.path.getmtime(weights):
+                            print(f"Exporting {weights} to {EXPORT_FORMAT}...")
+                            exported = self.export_model(EXPORT_FORMAT)
+                        weights = exported
+                    import torch
+                    repo, source = self._hub_source()
+                    print(f"Loading model from {weights} for the first time ({source} model definition).")
+                    CACHED_MODEL = torch.hub.load(repo, "custom", path=weights, source=source, trust_repo=True)
         self.model = CACHED_MODEL
 
+    def warmup(self):
+        """Run a dummy image through the model so the first real request does not pay for lazy init."""
+        dummy = np.zeros((INFERENCE_SIZE, INFERENCE_SIZE, 3), dtype=np.uint8)
+        # Bypass the detection cache: a blank image would otherwise be cached under hash 0 with
+        # no detections, and dark or uniform uploads hashing near 0 would be served from it
+        self.process_batch([dummy], use_cache=False)
+
+    def startup(self):
+        """Load and warm up the model at boot, reporting time-to-ready."""
+        start = time.perf_counter()
+        self.load_model()
+        loaded = time.perf_counter()
+        self.warmup()
+        ready = time.perf_counter()
+        print(f"YOLO ready in {ready - start:.2f}s (load {loaded - start:.2f}s, warmup {ready - loaded:.2f}s).")
+        return {"load_seconds": loaded - start, "warmup_seconds": ready - loaded, "ready_seconds": ready - start}
+
     def load_image(self, image):
-        """Load the input image."""
-        print(f"Loading image...")
-        if isinstance(image, str):  # If the input is a path, load the image from file
+        """
+        Load the input image as an RGB uint8 array, downscaled so its longest side is at most
+        MAX_IMAGE_SIDE. Files are turned upright according to their EXIF orientation, and JPEGs are
+        decoded at reduced size (draft mode). The returned array is a read-only copy of the
+        decoded pixels; it is reused for inference and annotation.
+        """
+        start = time.perf_counter()
+        if isinstance(image, (str, Path)):  # If the input is a path, load the image from file
             img = Image.open(image)
-        elif isinstance(image, Image.Image):  # If it's already a PIL Image
+            original_size = img.size
+            # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+            img.draft("RGB", (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+            # Gradio only applies the EXIF orientation to PIL uploads, not to file paths
+            ImageOps.exif_transpose(img, in_place=True)
+        elif isinstance(image, Image.Image):  # If it's already a PIL Image (already upright when from Gradio)
             img = image
-        elif isinstance(image, np.ndarray):  # If it's a numpy array, convert it to PIL Image
+            original_size = img.size
+        elif isinstance(image, np.ndarray):  # If it's a numpy array, use it without round-tripping through PIL
+            original_size = (image.shape[1], image.shape[0])
+            if image.dtype == np.uint8 and image.ndim == 3 and image.shape[2] == 3:
+                return self._downscale_array(image)
             img = Image.fromarray(image)
         else:
             raise ValueError("Unsupported image type. Expected a file path, PIL Image, or numpy array.")
 
-        return np.array(img)
+        width, height = img.size
+        scale = MAX_IMAGE_SIDE / max(width, height)
+        if scale < 1:
+            # reducing_gap lets Pillow use a cheap integer reduce() before the final resample
+            img = img.resize((round(width * scale), round(height * scale)), Image.Resampling.BILINEAR,
+                             reducing_gap=2.0)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        array = np.asarray(img)
+        print(f"Loaded image {original_size[0]}x{original_size[1]} -> {img.size[0]}x{img.size[1]} "
+              f"in {1000 * (time.perf_counter() - start):.1f} ms.")
+        return array
 
+    @staticmethod
+    def _downscale_array(image):
+        """Shrink an RGB array so its longest side is at most MAX_IMAGE_SIDE (no copy if already small)."""
+        height, width = image.shape[:2]
+        scale = MAX_IMAGE_SIDE / max(width, height)
+        if scale >= 1:
+            return image
+        import cv2
+        return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
 
     def perform_inference(self, image):
-        """Perform inference on the input image."""
+        """Perform inference on the input image (or list of images) and return the results."""
         print("Performing inference...")
-        self.results = self.model(image)
+        return self.model(image)
 
-    def display_results(self, image):
-        """Display and annotate the results on the image."""
-        annotated_image = image.copy()
+    def process_batch(self, images, use_cache=True):
+        """
+        Fast path: detect objects in several images with a single forward pass. Inputs may
+        be paths, PIL Images or numpy arrays; the model letterboxes them into one batch.
+        Returns one dict per image with its boxes and class counts, without drawing,
+        displaying or writing anything to disk, and without touching shared state.
+        Images found in the detection cache are not sent to the model at all
+        (`use_cache=False` neither reads nor fills the cache).
+        """
+        prepared = [self.prepare(image, use_cache=use_cache) for image in images]
+        detections = [detection for _, _, detection in prepared]
+        misses = [i for i, detection in enumerate(detections) if detection is None]
+        if misses:
+            for i, detection in zip(misses, self.infer_batch([prepared[i][0] for i in misses])):
+                detections[i] = detection
+                if use_cache:
+                    self.remember(prepared[i][1], detection)
+        return detections
 
-        for *box, conf, cls in self.results.xyxy[0]:
-            x1, y1, x2, y2 = map(int, box)
-            label = f"{self.results.names[int(cls)]} {conf:.2f}"
+    def prepare(self, image, use_cache=True):
+        """
+        Decode `image` and look it up in the detection cache, on the calling thread.
+        Returns (array, image_hash, cached detection or None).
+        """
+        with metrics.span("image_decode"):
+            array = self.load_image(image)
+        if not use_cache or self.cache is None:
+            return array, None, None
+        image_hash = dhash(array)
+        cached = self.cache.get(image_hash)
+        return array, image_hash, self._detection_from_cache(array, cached) if cached is not None else None
 
-            # Draw the bounding box
-            cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    def remember(self, image_hash, detection):
+        """Store a fresh detection of an image hashed by `prepare` in the detection cache."""
+        if self.cache is not None and image_hash is not None:
+            self.cache.put(image_hash, detection)
 
-            # Calculate label position
-            y_label = y1 - 10 if y1 - 10 > 10 else y1 + 20
+    def infer_batch(self, arrays):
+        """
+        Run the model once on decoded RGB arrays (see `prepare`), one detection per array.
+        This is the only step worth batching across requests, see app.yolo_batcher.
+        """
+        if self.model is None:
+            self.load_model()
+        with metrics.span("yolo_inference"):
+            results = self.model(list(arrays), size=INFERENCE_SIZE)
+        metrics.inc("yolo_images_inferred", len(arrays))
+        detections = []
+        for array, predictions in zip(arrays, results.xyxy):
+            boxes = predictions.cpu().numpy()  # (n, 6): x1, y1, x2, y2, confidence, class
+            detections.append({
+                "image": array,
+                "boxes": boxes,
+                "names": results.names,
+                "class_counts": dict(Counter(results.names[int(cls)] for cls in boxes[:, 5])),
+            })
+        return detections
 
-            # Add a filled rectangle for better label readability
-            (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(annotated_image, (x1, y_label - text_height - 5), (x1 + text_width, y_label + baseline - 5),
-                          (0, 255, 0), thickness=-1)
+    @staticmethod
+    def _detection_from_cache(image, cached):
+        """Attach a cached detection to the new image, rescaling boxes if its size differs."""
+        boxes = cached["boxes"]
+        height, width = image.shape[:2]
+        cached_height, cached_width = cached["shape"]
+        if (height, width) != (cached_height, cached_width):
+            boxes = boxes.copy()
+            boxes[:, [0, 2]] *= width / cached_width
+            boxes[:, [1, 3]] *= height / cached_height
+        return {
+            "image": image,
+            "boxes": boxes,
+            "names": cached["names"],
+            "class_counts": cached["class_counts"],
+        }
 
-            # Draw the label text
-            cv2.putText(annotated_image, label, (x1, y_label), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+    def detect(self, image, run_inference=None):
+        """
+        Fast path for a single image, see `process_batch`. Decoding, hashing and the cache
+        lookup happen on the calling thread; on a miss the array goes to `run_inference`
+        (e.g. a MicroBatcher over `infer_batch`, so a bad upload never fails other requests).
+        """
+        array, image_hash, detection = self.prepare(image)
+        if detection is None:
+            detection = run_inference(array) if run_inference else self.infer_batch([array])[0]
+            self.remember(image_hash, detection)
+        return detection
 
-        # Convert BGR to RGB for displaying with matplotlib
-        annotated_image = cv2.cvtColor(annotated_image, cv2.COLOR_BGR2RGB)
+    @staticmethod
+    def render_annotated(detection):
+        """Draw the boxes of a `detect` result on a copy of its image (RGB), on demand."""
+        import cv2
+        with metrics.span("annotation"):
+            annotated_image = detection["image"].copy()
+
+            for *box, conf, cls in detection["boxes"]:
+                x1, y1, x2, y2 = map(int, box)
+                label = f"{detection['names'][int(cls)]} {conf:.2f}"
+
+                # Draw the bounding box
+                cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+                # Calculate label position
+                y_label = y1 - 10 if y1 - 10 > 10 else y1 + 20
+
+                # Add a filled rectangle for better label readability
+                (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+                cv2.rectangle(annotated_image, (x1, y_label - text_height - 5), (x1 + text_width, y_label + baseline - 5),
+                              (0, 255, 0), thickness=-1)
+
+                # Draw the label text
+                cv2.putText(annotated_image, label, (x1, y_label), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+
+        return annotated_image
+
+    def display_results(self, image, results):
+        """Display the annotated results with matplotlib and save them to result.jpg (debugging only)."""
+        import cv2
+        import matplotlib.pyplot as plt
+        annotated_image = self.render_annotated({
+            "image": image,
+            "boxes": results.xyxy[0].cpu().numpy(),
+            "names": results.names,
+        })
 
         # Display the image
         plt.imshow(annotated_image)
@@ -79,13 +288,13 @@ class YOLOProcessor:
         # Save the annotated image
         cv2.imwrite('result.jpg', cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR))
 
-    def generate_class_counts_json(self, output_file="class_counts.json"):
+    def generate_class_counts_json(self, results, output_file="class_counts.json"):
         """Generate a JSON file with counts of each detected class."""
         # Extract all detected class indices
-        class_indices = [int(cls) for cls in self.results.xyxy[0][:, 5]]
+        class_indices = [int(cls) for cls in results.xyxy[0][:, 5]]
 
         # Map indices to class names
-        class_names = [self.results.names[idx] for idx in class_indices]
+        class_names = [results.names[idx] for idx in class_indices]
 
         # Count occurrences of each class
         class_counts = Counter(class_names)
@@ -101,20 +310,19 @@ class YOLOProcessor:
         return class_counts_dict
 
     def process(self, image_path):
-        """Complete pipeline to process the image."""
-        self.load_model()
-        image = self.load_image(image_path)
-        self.perform_inference(image)
-        self.display_results(image)
-        json_counts = self.generate_class_counts_json()
-        
-        return str(json_counts)
+        """Complete pipeline to process the image. Returns the class counts as a string."""
+        detection = self.detect(image_path)
+        return str(detection["class_counts"])
 
 if __name__ == "__main__":
     # Define paths
     weights_path = "best.pt"
     image_path = "test.jpg"
 
-    # Create YOLOProcessor instance and process the image
-    yolo_processor = YOLOProcessor(weights_path, image_path)
-    yolo_processor.process()
\ No newline at end of file
+    # Create YOLOProcessor instance, process the image and show the annotated result
+    yolo_processor = YOLOProcessor(weights_path)
+    yolo_processor.load_model()
+    image = yolo_processor.load_image(image_path)
+    results = yolo_processor.perform_inference(image)
+    yolo_processor.display_results(image, results)
+    yolo_processor.generate_class_counts_json(results)
\ No newline at end of file
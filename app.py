@@ -1,19 +1,136 @@
+import time
+IMPORT_START = time.perf_counter()
 import gradio as gr
-from rag import similarity_search, ask_question_with_context, get_prompt  # Import functions from rag.py
+from rag import hybrid_search, ask_question_with_context, get_prompt, merge_results, build_context, parse_filters, get_recipe_details  # Import functions from rag.py
+from rag import warm_up as warm_up_rag
 from YOLO import YOLOProcessor  # Import the YOLOProcessor class from YOLO.py
+from micro_batcher import MicroBatcher
+from detection_cache import DetectionCache
+from session_store import SessionStore
+from token_budget import trim_to_budget
+import metrics
 import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests  # For making HTTP requests to the local API
 
-# Initialize the YOLO model globally when the app starts
-yolo_processor = YOLOProcessor(weights_path="best.pt")
+# YOLO processor shared by every request, its model is loaded by warm_up
+yolo_processor = YOLOProcessor(
+    weights_path="best.pt",
+    cache=DetectionCache(
+        max_size=int(os.getenv("DETECTION_CACHE_SIZE", "256")),
+        max_distance=int(os.getenv("DETECTION_CACHE_MAX_DISTANCE", "4")),
+    ),
+)
 
-# Session history to keep track of conversations for different users
-session_history = {}
+# Images uploaded by concurrent users within a few milliseconds share one YOLO forward pass.
+# Only decoded arrays reach it: each request decodes and checks the cache on its own thread.
+yolo_batcher = MicroBatcher(
+    yolo_processor.infer_batch,
+    max_batch_size=int(os.getenv("YOLO_MAX_BATCH_SIZE", "8")),
+    max_wait=float(os.getenv("YOLO_BATCH_WAIT_MS", "10")) / 1000,
+    name="yolo-batcher",
+)
 
-def process_input(user_input, image):
+# Worker threads running the retrieval and detection stages of a request side by side
+pipeline_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PIPELINE_WORKERS", "8")),
+                                       thread_name_prefix="pipeline")
+
+# "background": the UI binds immediately while the models load in a warm-up thread;
+# "eager": everything is loaded before the UI starts
+STARTUP_MODE = os.getenv("APP_STARTUP_MODE", "background")
+warmup_done = threading.Event()
+first_request_seen = False
+
+def warm_up():
+    """Load and warm up the YOLO and embedding models (side by side) and the LLM client."""
+    start = time.perf_counter()
+    jobs = {"YOLO": pipeline_executor.submit(yolo_processor.startup), "RAG": pipeline_executor.submit(warm_up_rag)}
+    for name, job in jobs.items():
+        try:
+            job.result()
+        except Exception as error:
+            print(f"{name} warm-up failed, it will be loaded on first use. Error details:", error)
+    elapsed = time.perf_counter() - start
+    metrics.observe("warmup", elapsed)
+    print(f"Warm-up finished in {elapsed:.2f}s ({time.perf_counter() - IMPORT_START:.2f}s after startup).")
+    warmup_done.set()
+
+def wait_for_warm_up():
+    """Requests arriving during the warm-up wait for it instead of loading the models themselves."""
+    global first_request_seen
+    if not warmup_done.is_set():
+        start = time.perf_counter()
+        warmup_done.wait()
+        metrics.observe("warmup_wait", time.perf_counter() - start)
+    if not first_request_seen:
+        first_request_seen = True
+        print(f"First request started {time.perf_counter() - IMPORT_START:.2f}s after startup.")
+
+if STARTUP_MODE == "eager":
+    warm_up()
+else:
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+# Requests Gradio handles at the same time (its default of 1 would serialize every user,
+# leaving nothing for the YOLO and query embedding micro-batchers to group)
+APP_CONCURRENCY = int(os.getenv("APP_CONCURRENCY", "16"))
+# Recipes retrieved per query and passed to the LLM
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+# Session history to keep track of conversations for different users, keyed by Gradio session
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+    ttl=float(os.getenv("SESSION_TTL", "3600")),
+    max_chars=int(os.getenv("SESSION_MAX_CHARS", "20000000")),
+)
+# Tokens of earlier turns resent to LocaLlama with each new message
+HISTORY_TOKEN_BUDGET = int(os.getenv("LOCAL_LLAMA_HISTORY_TOKENS", "1024"))
+# Ollama chat endpoint and model used by LocaLlama
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
+
+# Cache, batching and session statistics reported on the metrics endpoint
+metrics.register_collector("detection_cache", yolo_processor.cache.stats)
+metrics.register_collector("yolo_batcher", yolo_batcher.stats)
+metrics.register_collector("sessions", session_store.stats)
+
+def run_pipeline(user_input, image):
+    """
+    Run the stages before the LLM call with as much overlap as possible:
+    retrieval on the user's text runs while YOLO detects the ingredients in the image,
+    then a second retrieval on the detected ingredients runs and both are merged.
+    Dietary and allergy constraints in the user's text filter both retrievals.
+    Returns (detection, image_info, search_results).
+    """
+    filters = parse_filters(user_input)
+    text_search = pipeline_executor.submit(hybrid_search, user_input, None, RETRIEVAL_TOP_K,
+                                           filters) if user_input else None
+    detection_job = pipeline_executor.submit(yolo_processor.detect, image, yolo_batcher) if image else None
+
+    detection = None
+    image_info = None
+    ingredient_search = None
+    if detection_job is not None:
+        detection = detection_job.result()
+        image_info = str(detection["class_counts"])
+        if detection["class_counts"]:
+            ingredients = list(detection["class_counts"])
+            ingredient_search = pipeline_executor.submit(hybrid_search, ", ".join(ingredients), ingredients,
+                                                         RETRIEVAL_TOP_K, filters)
+
+    search_results = merge_results(
+        *(job.result() for job in (text_search, ingredient_search) if job is not None),
+        top_k=RETRIEVAL_TOP_K,
+    )
+    return detection, image_info, search_results
+
+def process_input(user_input, image, detection=None, recipe_ids=None):
     """
-    Handles text input and optional image upload. Calls similarity_search and ask_question_with_context.
+    Handles text input and optional image upload. Calls hybrid_search and ask_question_with_context.
     If an image is uploaded, processes the image with YOLO and generates a prompt.
+    Yields the chat as the answer streams in, so the first tokens show up immediately.
     """
     if image or user_input:
         # Create the user message (with image if provided)
@@ -21,82 +138,135 @@ def process_input(user_input, image):
         if image:
             # Convert image to a format suitable for display
             user_message["image"] = image
+        yield [user_message], "", None, detection, recipe_ids  # Show the user message and reset the input fields
 
-        # Process the image with YOLO and get the prompt
-        image_info = None
-        if image:
-            image_info = yolo_processor.process(image)
+        # Detect ingredients and retrieve matching recipes concurrently, then build the prompt
+        # Detections are kept per session (gr.State) for the "More Details" button
+        with metrics.span("pipeline"):
+            new_detection, image_info, search_results = run_pipeline(user_input, image)
+        if new_detection is not None:
+            detection = new_detection
+        # Only ids are kept per session, full recipes are fetched if "More Details" is clicked
+        recipe_ids = [record["id"] for record in search_results]
         prompt = get_prompt(user_input, image_info)
 
-        # Perform the AI task and generate the response
-        response = ask_question_with_context(prompt, [])
-        assistant_message = {"role": "assistant", "content": response}
-        return [user_message, assistant_message], "", None  # Reset user_input and image fields
-    
+        # Perform the AI task and stream the response
+        assistant_message = {"role": "assistant", "content": ""}
+        chunks = ask_question_with_context(prompt, build_context(search_results), stream=True)
+        if chunks is None:
+            assistant_message["content"] = "Error communicating with the recipe assistant."
+            yield [user_message, assistant_message], "", None, detection, recipe_ids
+            return
+        try:
+            for chunk in chunks:
+                assistant_message["content"] += chunk
+                yield [user_message, assistant_message], "", None, detection, recipe_ids
+        except Exception as error:
+            print("Streaming the answer failed, error details:", error)
+            if assistant_message["content"]:
+                assistant_message["content"] += "\n\n*(The answer was interrupted.)*"
+            else:
+                assistant_message["content"] = "Error communicating with the recipe assistant."
+            yield [user_message, assistant_message], "", None, detection, recipe_ids
+            return
+        if not assistant_message["content"]:
+            assistant_message["content"] = "No content received."
+            yield [user_message, assistant_message], "", None, detection, recipe_ids
+        return
+
     # If no valid input is provided
-    return [{"role": "assistant", "content": "Please provide a message or an image."}], "", None
+    yield [{"role": "assistant", "content": "Please provide a message or an image."}], "", None, detection, recipe_ids
 
-def call_local_llama(user_input, image):
+def call_local_llama(user_input, image, detection=None, recipe_ids=None, session_id="default"):
     """
     Handles text input and optional image upload for the LocaLlama API call.
+    Yields the chat as Ollama streams the answer back.
     """
-    # Generate or retrieve session_id for the user (mocked with chat_history for simplicity)
-    session_id = "current_session"  # Replace with actual session management logic if needed
-    if session_id not in session_history:
-        session_history[session_id] = []  # Initialize session history for a new session
-    
-    # Add user message to session history
+    # Create the user message for the chat
     user_message = {"role": "user", "content": user_input or "Image uploaded for recipe suggestion."}
     if image:
         user_message["image"] = image  # Optionally add image to the message
-    session_history[session_id].append(user_message)
+    yield [user_message], "", None, detection, recipe_ids  # Show the user message and reset the input fields
 
     # Process the image with YOLO and get the prompt
     image_info = None
     if image:
-        image_info = yolo_processor.process(image)
+        detection = yolo_processor.detect(image, yolo_batcher)
+        image_info = str(detection["class_counts"])
     prompt = get_prompt(user_input, image_info) if user_input or image else "No query provided."
 
-    # Construct the messages list to include the session history (last 5 messages for context)
-    messages = [{"role": "user", "content": prompt}]
-    
-    # Add the last 5 messages from session history to context (both user and assistant messages)
-    conversation_context = session_history[session_id][-5:]  # Get the last 5 messages
-    for msg in conversation_context:
-        messages.append({"role": msg['role'], "content": msg['content']})
+    # The most recent earlier turns of this session that fit the token budget, then the new prompt
+    conversation_context = trim_to_budget(session_store.get(session_id), HISTORY_TOKEN_BUDGET)
+    messages = conversation_context + [{"role": "user", "content": prompt}]
     
     # Make the POST request to the Llama API with the updated messages
+    start = time.perf_counter()
     try:
         response = requests.post(
-            "http://localhost:11434/api/chat",
+            OLLAMA_URL,
             json={
-                "model": "llama3.2:3b",  # Model version or identifier
+                "model": OLLAMA_MODEL,  # Model version or identifier
                 "messages": messages,  # Include the full conversation history
-                "stream": False  # Set to True if you want streaming responses
+                "stream": True  # Ollama sends one JSON object per line as tokens are generated
             },
+            stream=True,
             timeout=3000
         )
         if response.status_code == 200:
-            result = response.json()
-            message = result.get("message", {})
-            content = message.get("content", "No content received.")
-            assistant_message = {"role": "assistant", "content": content}
-            
-            # Append the assistant's response to session history
-            session_history[session_id].append(assistant_message)
-
-            return [user_message, assistant_message], "", None  # Return response
+            assistant_message = {"role": "assistant", "content": ""}
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                if "error" in result:
+                    assistant_message["content"] += f"\nError: {result['error']}"
+                    yield [user_message, assistant_message], "", None, detection, recipe_ids
+                    break
+                content = result.get("message", {}).get("content", "")
+                if content and not assistant_message["content"]:
+                    metrics.observe("ollama_first_token", time.perf_counter() - start)
+                assistant_message["content"] += content
+                yield [user_message, assistant_message], "", None, detection, recipe_ids
+                if result.get("done"):
+                    break
+            if not assistant_message["content"]:
+                assistant_message["content"] = "No content received."
+                yield [user_message, assistant_message], "", None, detection, recipe_ids
+
+            metrics.observe("ollama_generation", time.perf_counter() - start)
+            # Record the completed turn in the session history
+            # The user's own words, not the prompt with its instructions and detection dict
+            session_store.append(session_id, {"role": "user", "content": user_message["content"]}, assistant_message)
         else:
-            return [{"role": "assistant", "content": f"Error: {response.status_code} - {response.text}"}], "", None
+            yield [{"role": "assistant", "content": f"Error: {response.status_code} - {response.text}"}], "", None, detection, recipe_ids
     except Exception as e:
-        return [{"role": "assistant", "content": f"Error communicating with LocaLlama API: {str(e)}"}], "", None
-    
-    # If no valid input is provided
-    return [{"role": "assistant", "content": "Please provide a message or an image."}], "", None
+        yield [{"role": "assistant", "content": f"Error communicating with LocaLlama API: {str(e)}"}], "", None, detection, recipe_ids
+
+def respond(user_input, image, use_local_llama, detection, recipe_ids, request: gr.Request):
+    """Route the request to LocaLlama or the remote RAG pipeline, streaming either way."""
+    metrics.inc("requests_local_llama" if use_local_llama else "requests_rag")
+    wait_for_warm_up()
+    if use_local_llama:
+        yield from call_local_llama(user_input, image, detection, recipe_ids, session_id=request.session_hash)
+    else:
+        yield from process_input(user_input, image, detection, recipe_ids)
+
+def display_image(detection):
+    """Render the session's last detection below the 'More Details' button, only when asked for"""
+    if detection is None:
+        return gr.Image(visible=False)
+    return gr.Image(YOLOProcessor.render_annotated(detection), label="Annotated Image", visible=True)
 
-def display_image():
-    """Function to display the image below the 'More Details' button"""
-    return gr.Image("result.jpg", label="Annotated Image", visible=True)
+def display_recipe_details(recipe_ids):
+    """Fetch every column of the recipes behind the last answer, only when asked for"""
+    recipes = get_recipe_details(recipe_ids or [])
+    if not recipes:
+        return gr.Markdown(visible=False)
+    sections = []
+    for recipe in recipes:
+        fields = "\n".join(f"- **{column}**: {value}" for column, value in recipe.items() if column not in ("id", "name"))
+        sections.append(f"### {recipe.get('name', recipe['id'])}\n{fields}")
+    return gr.Markdown("\n\n".join(sections), visible=True)
 
 # Front-End Layout using Gradio
 with gr.Blocks(css="""
@@ -207,7 +377,7 @@ with gr.Blocks(css="""
     with gr.Row(elem_classes=["main-content"]):
         with gr.Column(scale=1, min_width=400, elem_classes=["right-column"]):  # All input buttons on the right side
             with gr.Row():
-                image_upload = gr.Image(label="Upload an Image (Optional)", type="pil")
+                image_upload = gr.Image(label="Upload an Image (Optional)", type="filepath")  # Path lets YOLO decode at reduced size
             user_input = gr.Textbox(
                 placeholder="Type your message here...",
                 label="Your Message",
@@ -219,6 +389,9 @@ with gr.Blocks(css="""
             model_choice = gr.Checkbox(label="Use LocaLlama", value=False)
             more_details_btn = gr.Button("More Details", elem_id="more_details_btn")
             results_image = gr.Image(label="Annotated Image", elem_id="results_image", visible=False)
+            recipe_details = gr.Markdown(visible=False)
+            last_detection = gr.State(None)  # Per-session YOLO detections of the last uploaded image
+            last_recipe_ids = gr.State(None)  # Ids of the recipes retrieved for the last answer
         
         with gr.Column(scale=2, min_width=600, elem_classes=["left-column"]):  
             chatbot = gr.Chatbot([], label="Chatbot", elem_classes=["chatbox"], type="messages")
@@ -234,17 +407,28 @@ with gr.Blocks(css="""
 
     # Define interactions
     submit_btn.click(
-        lambda user_input, image, use_local_llama: call_local_llama(user_input, image) if use_local_llama else process_input(user_input, image),
-        inputs=[user_input, image_upload, model_choice],
-        outputs=[chatbot, user_input, image_upload],
+        respond,
+        inputs=[user_input, image_upload, model_choice, last_detection, last_recipe_ids],
+        outputs=[chatbot, user_input, image_upload, last_detection, last_recipe_ids],
     )
 
     more_details_btn.click(
         display_image,
-        inputs=[],
+        inputs=[last_detection],
         outputs=[results_image],
     )
+    more_details_btn.click(
+        display_recipe_details,
+        inputs=[last_recipe_ids],
+        outputs=[recipe_details],
+    )
+
+import_seconds = time.perf_counter() - IMPORT_START
+metrics.observe("app_import", import_seconds)
+print(f"App ready to bind in {import_seconds:.2f}s ({STARTUP_MODE} startup).")
 
 # Launch the app
 if __name__ == "__main__":
+    metrics.start_server()
+    demo.queue(default_concurrency_limit=APP_CONCURRENCY)
     demo.launch()
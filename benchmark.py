@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# End-to-end latency benchmark of MealMate against local stand-ins for its services:
+#   - a fake OpenAI-compatible /v1/chat/completions server (LLMClient)
+#   - a fake Ollama /api/chat server (LocaLlama)
+#   - a synthetic in-memory/memory-mapped recipe index (RAG_RETRIEVAL_BACKEND=local)
+# The query encoder and YOLO model are the real ones, so their cost is part of the numbers.
+#
+# Usage: python benchmark.py --scenarios similarity_search,process_input --concurrency 8 --requests 200
+# Prints (or writes with --output) per-stage p50/p95/p99 latency and throughput as JSON,
+# to be compared between commits.
+
+SCENARIOS = ["similarity_search", "process_input", "local_llama", "yolo"]
+
+INGREDIENTS = ["tomato", "onion", "garlic", "chicken", "rice", "potato", "carrot", "egg", "cheese", "spinach",
+               "mushroom", "lemon", "honey", "blueberry", "basil", "beef", "tofu", "pasta", "pepper", "apple"]
+QUESTION_TEMPLATES = [
+    "What can I cook with {} and {}?",
+    "Give me a quick dinner recipe using {} and {}.",
+    "We have {} and {} at home, any recipe ideas?",
+    "Suggest a healthy lunch with {} and {}.",
+]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions (SSE when streaming) and Ollama NDJSON chat, with a fixed token rate."""
+    protocol_version = "HTTP/1.1"
+    tokens = 64
+    token_delay = 0.005
+    first_token_delay = 0.05
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/v1/chat/completions"):
+            if payload.get("stream"):
+                self._stream("text/event-stream", self._openai_events())
+            else:
+                time.sleep(self.first_token_delay + self.tokens * self.token_delay)
+                body = json.dumps({"choices": [{"message": {"role": "assistant", "content": self._answer()}}]})
+                self._send(body.encode("utf-8"))
+        elif self.path.endswith("/api/chat"):
+            self._stream("application/x-ndjson", self._ollama_lines())
+        else:
+            self.send_error(404)
+
+    def _answer(self):
+        return " ".join(f"token{i}" for i in range(self.tokens))
+
+    def _openai_events(self):
+        for i in range(self.tokens):
+            yield "data: " + json.dumps({"choices": [{"delta": {"content": f"token{i} "}}]}) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    def _ollama_lines(self):
+        for i in range(self.tokens):
+            yield json.dumps({"message": {"role": "assistant", "content": f"token{i} "}, "done": False}) + "\n"
+        yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, content_type, chunks):
+        # Chunked transfer encoding keeps the connection reusable, like the real servers
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_fake_llm_server(tokens, token_delay, first_token_delay):
+    """Serve FakeLLMHandler on a free local port in a daemon thread. Returns its base URL."""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {
+        "tokens": tokens, "token_delay": token_delay, "first_token_delay": first_token_delay,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-llm-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build_synthetic_index(directory, recipes, dim, seed=0):
+    """Write a local_index.py-compatible index of `recipes` random recipes into `directory`."""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((recipes, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(os.path.join(directory, "embeddings.npy"), embeddings.astype(np.float16))
+    np.save(os.path.join(directory, "ids.npy"), np.arange(1, recipes + 1, dtype=np.int64))
+
+    offsets = np.empty(recipes + 1, dtype=np.int64)
+    offsets[0] = 0
+    with open(os.path.join(directory, "recipes.jsonl"), "wb") as recipes_file:
+        for i in range(recipes):
+            ingredients = [INGREDIENTS[j] for j in rng.choice(len(INGREDIENTS), 5, replace=False)]
+            recipe = {
+                "id": i + 1,
+                "name": f"{ingredients[0]} and {ingredients[1]} dish {i + 1}",
+                "description": f"A simple recipe with {', '.join(ingredients)}. " * 4,
+                "ingredients": str(ingredients),
+                "steps": str([f"step {step} of the recipe" for step in range(12)]),
+                "tags": "vegetarian" if i % 3 else "vegan",
+                "minutes": int(rng.integers(10, 120)),
+            }
+            line = json.dumps(recipe).encode("utf-8") + b"\n"
+            recipes_file.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+
+
+def build_images(directory, count, size=(640, 480), seed=0):
+    """Write `count` distinct random JPEG images (distinct, so the detection cache cannot serve them)."""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"image_{i}.jpg")
+        Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def make_questions(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(QUESTION_TEMPLATES).format(*rng.sample(INGREDIENTS, 2)) + f" (#{i})" for i in range(count)]
+
+
+class StageRecorder:
+    """Thread-safe collection of per-stage latencies (seconds)."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        report = {}
+        for stage, samples in self.samples.items():
+            values = np.array(samples) * 1000
+            report[stage] = {
+                "count": len(values),
+                "mean_ms": round(float(values.mean()), 3),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p95_ms": round(float(np.percentile(values, 95)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+                "max_ms": round(float(values.max()), 3),
+            }
+        return report
+
+
+def run_scenario(name, call, inputs, concurrency, recorder):
+    """Run `call(item, recorder)` for every input on `concurrency` threads and summarise the timings."""
+    errors = []
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            call(item, recorder)
+        except Exception as error:
+            errors.append(repr(error))
+            return
+        recorder.record("total", time.perf_counter() - start)
+
+    print(f"Running {name}: {len(inputs)} requests at concurrency {concurrency}...", file=sys.stderr)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, inputs))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(inputs),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round((len(inputs) - len(errors)) / elapsed, 3) if elapsed else 0.0,
+        "stages": recorder.summary(),
+    }
+
+
+def consume_chat(generator, recorder, start):
+    """Drain a chat generator of app.py, recording the time to the first assistant token."""
+    first_token = False
+    for chat, *_ in generator:
+        if not first_token and len(chat) > 1 and chat[-1]["role"] == "assistant" and chat[-1]["content"]:
+            recorder.record("first_token", time.perf_counter() - start)
+            first_token = True
+
+
+def similarity_search_scenario(args, questions, images):
+    import rag
+
+    def call(question, recorder):
+        start = time.perf_counter()
+        rag.embed_query(question)
+        recorder.record("embed", time.perf_counter() - start)
+        start = time.perf_counter()
+        rag.similarity_search(question, top_k=args.top_k)
+        recorder.record("search", time.perf_counter() - start)
+
+    return call, questions
+
+
+def process_input_scenario(args, questions, images):
+    import app
+
+    # Time the retrieval/detection stage through app's module global, which process_input looks up
+    run_pipeline = app.run_pipeline
+    current = {"recorder": None}
+
+    def timed_pipeline(*pipeline_args):
+        start = time.perf_counter()
+        try:
+            return run_pipeline(*pipeline_args)
+        finally:
+            current["recorder"].record("retrieval_and_detection", time.perf_counter() - start)
+
+    app.run_pipeline = timed_pipeline
+
+    def call(item, recorder):
+        question, image = item
+        current["recorder"] = recorder
+        consume_chat(app.process_input(question, image), recorder, time.perf_counter())
+
+    inputs = [(question, images[i] if images else None) for i, question in enumerate(questions)]
+    return call, inputs
+
+
+def local_llama_scenario(args, questions, images):
+    import app
+
+    def call(question, recorder):
+        start = time.perf_counter()
+        consume_chat(app.call_local_llama(question, None, session_id=f"benchmark-{threading.get_ident()}"),
+                     recorder, start)
+
+    return call, questions
+
+
+def yolo_scenario(args, questions, images):
+    from YOLO import YOLOProcessor
+    processor = YOLOProcessor(weights_path=args.weights)
+    processor.load_model()
+
+    def call(image_path, recorder):
+        start = time.perf_counter()
+        processor.process(image_path)
+        recorder.record("detect", time.perf_counter() - start)
+
+    return call, images
+
+
+SCENARIO_BUILDERS = {
+    "similarity_search": similarity_search_scenario,
+    "process_input": process_input_scenario,
+    "local_llama": local_llama_scenario,
+    "yolo": yolo_scenario,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MealMate end-to-end latency benchmark")
+    parser.add_argument("--scenarios", default="similarity_search,process_input",
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5, help="requests per scenario excluded from the results")
+    parser.add_argument("--recipes", type=int, default=50_000, help="size of the synthetic recipe index")
+    parser.add_argument("--dim", type=int, default=768, help="embedding size of the query encoder")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens streamed per fake LLM answer")
+    parser.add_argument("--token-delay-ms", type=float, default=5.0)
+    parser.add_argument("--first-token-delay-ms", type=float, default=50.0)
+    parser.add_argument("--with-images", action="store_true", help="attach an image to process_input requests")
+    parser.add_argument("--images", nargs="*", help="image files to use instead of generated ones")
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="mealmate-benchmark-")
+    index_dir = os.path.join(workdir, "index")
+    os.makedirs(index_dir)
+    build_synthetic_index(index_dir, args.recipes, args.dim)
+    llm_url = start_fake_llm_server(args.tokens, args.token_delay_ms / 1000, args.first_token_delay_ms / 1000)
+
+    # Point the app at the stand-ins before its modules are imported (load_dotenv keeps these)
+    os.environ.update({
+        "LLM_API_URL": f"{llm_url}/v1/chat/completions",
+        "OLLAMA_URL": f"{llm_url}/api/chat",
+        "RAG_RETRIEVAL_BACKEND": "local",
+        "LOCAL_INDEX_DIR": index_dir,
+        "QUERY_CACHE_PATH": "",
+    })
+
+    total = args.requests + args.warmup
+    questions = make_questions(total)
+    images = []
+    if args.with_images or "yolo" in scenarios:
+        paths = args.images or build_images(workdir, total)
+        images = [paths[i % len(paths)] for i in range(total)]
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "arguments": vars(args),
+        },
+        "scenarios": {},
+    }
+    for name in scenarios:
+        call, inputs = SCENARIO_BUILDERS[name](args, questions, images if name == "yolo" or args.with_images else [])
+        inputs = list(inputs)
+        run_scenario(f"{name} (warm-up)", call, inputs[:args.warmup], args.concurrency, StageRecorder())
+        report["scenarios"][name] = run_scenario(name, call, inputs[args.warmup:total], args.concurrency,
+                                                 StageRecorder())
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+        print(f"Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from dotenv import load_dotenv
+import metrics
+
+# Shared, thread-safe PostgreSQL connection pool used by rag.py and postgreConnect.py
+
+# Load environment variables
+load_dotenv()
+
+# Database connection parameters
+host = os.getenv("SCW_DB_HOST")
+port = os.getenv("SCW_DB_PORT")
+database = os.getenv("SCW_DB_NAME")
+user = os.getenv("SCW_DB_USER")
+password = os.getenv("SCW_DB_PASSWORD")
+
+# Pool sizing and health check settings
+POOL_MIN_SIZE = int(os.getenv("SCW_DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("SCW_DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.getenv("SCW_DB_POOL_TIMEOUT", "30"))
+# Connections idle for longer than this (seconds) are pinged before being handed out
+POOL_PING_AFTER = float(os.getenv("SCW_DB_POOL_PING_AFTER", "30"))
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers its prepared statements and last use."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+                _pool = ThreadedConnectionPool(
+                    POOL_MIN_SIZE,
+                    POOL_MAX_SIZE,
+                    host=host,
+                    port=port,
+                    database=database,
+                    user=user,
+                    password=password,
+                    connection_factory=PooledConnection,
+                    # Keep long-lived connections alive through NAT and load balancers
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=3,
+                )
+                print(f"Database pool created (min={POOL_MIN_SIZE}, max={POOL_MAX_SIZE}).")
+    return _pool
+
+
+def close_pool():
+    """Close every pooled connection."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _pool_slots = None
+
+
+def is_connection_lost(error, connection=None):
+    """
+    Whether `error` means the connection itself is unusable and must be replaced: the
+    connection is closed, or the SQLSTATE is of class 08 (connection exception). Other
+    OperationalErrors (statement timeout, deadlock, lock not available) leave it usable.
+    """
+    if isinstance(error, psycopg2.InterfaceError):
+        return True
+    if connection is not None and connection.closed:
+        return True
+    return isinstance(error, psycopg2.Error) and (error.pgcode or "").startswith("08")
+
+
+def _is_healthy(connection):
+    """Cheap checks first, then a round trip if the connection sat idle for a while."""
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    try:
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        if time.monotonic() - connection.last_used > POOL_PING_AFTER:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            connection.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _checkout(pool):
+    """Take a healthy connection out of `pool`, replacing broken ones."""
+    while True:
+        connection = pool.getconn()
+        if _is_healthy(connection):
+            return connection
+        print("Discarding broken database connection and reconnecting.")
+        metrics.inc("db_connections_discarded")
+        pool.putconn(connection, close=True)
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrow a connection from the pool. Blocks up to POOL_TIMEOUT seconds when every
+    connection is in use. Broken connections are closed instead of being returned.
+    """
+    # Keep the pool the connection comes from, in case close_pool() runs meanwhile
+    with _pool_lock:
+        pool = _pool
+        slots = _pool_slots
+    if pool is None:
+        pool = get_pool()
+        slots = _pool_slots
+    with metrics.span("db_pool_wait"):
+        acquired = slots.acquire(timeout=POOL_TIMEOUT)
+    if not acquired:
+        metrics.inc("db_pool_timeouts")
+        raise PoolError(f"No database connection available after {POOL_TIMEOUT}s")
+    connection = None
+    broken = False
+    try:
+        connection = _checkout(pool)
+        yield connection
+    except psycopg2.Error as error:
+        broken = is_connection_lost(error, connection)
+        raise
+    finally:
+        if connection is not None:
+            if not broken and not connection.closed:
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    broken = True
+            connection.last_used = time.monotonic()
+            if pool.closed:  # close_pool() ran while the connection was borrowed
+                connection.close()
+            else:
+                pool.putconn(connection, close=broken or bool(connection.closed))
+        slots.release()
+
+
+def run(operation, retries=1):
+    """
+    Run `operation(cursor)` on a pooled connection and return its result.
+    If the connection drops mid-way (see is_connection_lost), retry on a fresh connection;
+    any other error is raised as is, without running the operation again.
+    """
+    for attempt in range(retries + 1):
+        connection = None
+        try:
+            with get_connection() as connection:
+                with connection.cursor() as cursor:
+                    result = operation(cursor)
+                connection.commit()
+                return result
+        except psycopg2.Error as error:
+            if attempt == retries or not is_connection_lost(error, connection):
+                raise
+            print(f"Database connection lost ({error}), retrying...")
+
+
+def execute_prepared(cursor, name, arg_types, statement, params):
+    """
+    Execute `statement` (written with $1, $2, ... placeholders) as a server-side
+    prepared statement, preparing it once per connection.
+    """
+    connection = cursor.connection
+    if name not in connection.prepared:
+        cursor.execute(f"PREPARE {name} ({', '.join(arg_types)}) AS {statement}")
+        connection.prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+def set_vector_search_params(cursor, ef_search=None, probes=None):
+    """
+    Set pgvector's query-time recall/latency knobs for the current transaction only:
+    `hnsw.ef_search` for HNSW indexes and `ivfflat.probes` for IVFFlat indexes.
+    """
+    if ef_search:
+        cursor.execute("SET LOCAL hnsw.ef_search = %s;", (int(ef_search),))
+    if probes:
+        cursor.execute("SET LOCAL ivfflat.probes = %s;", (int(probes),))
+
+
+def to_vector_literal(embedding):
+    """Format an embedding as pgvector's text input, e.g. '[0.1,0.2,0.3]'."""
+    return "[" + ",".join(map(str, embedding)) + "]"
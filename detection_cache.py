@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash of an RGB numpy image: compares neighbouring pixels of a
+    (hash_size + 1) x hash_size grayscale thumbnail, so re-encoded or slightly resized
+    copies of a photo land within a few bits of each other.
+    """
+    thumbnail = Image.fromarray(image).convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class DetectionCache:
+    """
+    Thread-safe LRU cache of YOLO detections keyed on a perceptual image hash.
+    A lookup hits when a stored hash is within `max_distance` bits (Hamming distance).
+    Entries keep the boxes, class names, class counts and the size of the image they
+    were computed on, not the image itself.
+    """
+
+    def __init__(self, max_size=256, max_distance=4):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # hash -> detection
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, image_hash):
+        with self._lock:
+            key = image_hash if image_hash in self._entries else None
+            if key is None:
+                best_distance = self.max_distance + 1
+                for candidate in self._entries:
+                    distance = (candidate ^ image_hash).bit_count()
+                    if distance < best_distance:
+                        key, best_distance = candidate, distance
+            if key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, image_hash, detection):
+        with self._lock:
+            self._entries[image_hash] = {
+                "boxes": detection["boxes"],
+                "names": detection["names"],
+                "class_counts": detection["class_counts"],
+                "shape": detection["image"].shape[:2],
+            }
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,107 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_text(text):
+    """Cache key for a query: case- and whitespace-insensitive."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query embeddings keyed on normalised text.
+    Entries expire after `ttl` seconds (0 disables expiry). If `path` is set the cache
+    can be saved to / loaded from a compressed .npz file so a restarted app starts warm.
+    """
+
+    def __init__(self, max_size=1024, ttl=0, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (embedding, created_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text):
+        key = normalize_text(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text, embedding, created_at=None):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        # Cached arrays are shared between callers, so they must not be modified in place
+        embedding.setflags(write=False)
+        key = normalize_text(text)
+        with self._lock:
+            self._entries[key] = (embedding, created_at or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, text, compute):
+        """Return the cached embedding for `text`, computing and storing it on a miss."""
+        embedding = self.get(text)
+        if embedding is None:
+            embedding = np.asarray(compute(text), dtype=np.float32)
+            self.put(text, embedding)
+        return embedding
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def save(self, path=None):
+        """Write the cache to disk (oldest entries first, so LRU order survives a reload)."""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._entries)
+            if not keys:
+                return
+            embeddings = np.stack([self._entries[key][0] for key in keys])
+            created_at = np.array([self._entries[key][1] for key in keys], dtype=np.float64)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, keys=np.array(keys), embeddings=embeddings, created_at=created_at)
+        os.replace(tmp_path, path)
+        print(f"Saved {len(keys)} cached query embeddings to {path}.")
+
+    def load(self, path=None):
+        """Load entries saved by `save`, skipping the ones that already expired."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with np.load(path) as data:
+                keys, embeddings, created_at = data["keys"], data["embeddings"], data["created_at"]
+        except (OSError, KeyError, ValueError) as error:
+            print(f"Could not load query embedding cache from {path}: {error}")
+            return
+        now = time.time()
+        for key, embedding, created in zip(keys, embeddings, created_at):
+            if not self.ttl or now - created <= self.ttl:
+                self.put(str(key), embedding, created_at=float(created))
+        print(f"Loaded {len(self)} cached query embeddings from {path}.")
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+import metrics
+from micro_batcher import MicroBatcher
+
+# The sentence embedding model shared by rag.py and postgreConnect.py, loaded on first use.
+# sentence_transformers (and torch) are only imported then, so importing the callers stays cheap.
+
+load_dotenv()
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
+
+# Encoder used for search queries (stored embeddings are always computed with "torch"):
+# - "torch": the full-precision model
+# - "int8": the same weights with dynamic INT8 quantization of the Linear layers (CPU)
+# - "onnx": the exported ONNX graph run by onnxruntime (needs optimum[onnxruntime])
+QUERY_ENCODER_BACKEND = os.getenv("QUERY_ENCODER_BACKEND", "torch")
+# ONNX file to load for the "onnx" backend, e.g. "onnx/model_qint8_avx512_vnni.onnx" for a quantized graph
+QUERY_ENCODER_ONNX_FILE = os.getenv("QUERY_ENCODER_ONNX_FILE", "")
+BACKENDS = ("torch", "int8", "onnx")
+
+# Queries of concurrent requests arriving within QUERY_BATCH_WAIT_MS share one forward pass
+# (QUERY_BATCH_SIZE=1 encodes every query on its caller's thread)
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+
+_models = {}  # backend -> SentenceTransformer
+_model_lock = threading.Lock()
+
+
+def _load_model(backend):
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    if backend == "int8":
+        import torch
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if backend == "onnx":
+        model_kwargs = {"file_name": QUERY_ENCODER_ONNX_FILE} if QUERY_ENCODER_ONNX_FILE else None
+        # Exports the model to ONNX on first use if the repository does not ship the file
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+    raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def get_model(backend="torch"):
+    """Return the process-wide model for `backend`, loading it on first use (concurrent callers wait for it)."""
+    model = _models.get(backend)
+    if model is None:
+        with _model_lock:
+            model = _models.get(backend)
+            if model is None:
+                start = time.perf_counter()
+                model = _models[backend] = _load_model(backend)
+                print(f"Embedding model {EMBEDDING_MODEL_NAME} ({backend}) loaded in "
+                      f"{time.perf_counter() - start:.2f}s.")
+    return model
+
+
+def encode(texts, backend="torch", **kwargs):
+    """SentenceTransformer.encode with the shared model of `backend`."""
+    return get_model(backend).encode(texts, **kwargs)
+
+
+def encode_queries(queries):
+    """Embeddings of several search queries in one forward pass, one array per query."""
+    return list(encode(queries, backend=QUERY_ENCODER_BACKEND, batch_size=len(queries)))
+
+
+query_batcher = MicroBatcher(
+    encode_queries,
+    max_batch_size=QUERY_BATCH_SIZE,
+    max_wait=QUERY_BATCH_WAIT_MS / 1000,
+    name="query-embedding-batcher",
+)
+metrics.register_collector("query_batcher", query_batcher.stats)
+
+
+def encode_query(query):
+    """
+    Embedding of a search query with the configured QUERY_ENCODER_BACKEND. The calling
+    thread blocks while its query is encoded together with other requests' queries.
+    """
+    if QUERY_BATCH_SIZE <= 1:
+        return encode(query, backend=QUERY_ENCODER_BACKEND)
+    return query_batcher(query)
@@ -1,8 +1,19 @@
+import asyncio
 import requests
 import json
+import time
+import aiohttp
+import metrics
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 
 class LLMClient:
-    def __init__(self, api_url, api_key, model="llama-3.1-8b-instruct"):
+    def __init__(self, api_url, api_key, model="llama-3.1-8b-instruct", pool_size=10,
+                 timeout=(10, 120), max_retries=3, backoff_factor=0.5):
         self.api_url = api_url
         self.api_key = api_key
         self.headers = {
@@ -11,11 +22,38 @@ class LLMClient:
         }
         # print(f"Initialized with headers: {self.headers}")  # 调试用
         self.model = model
+        # (connect, read) timeouts in seconds, so a hung request never blocks a worker forever
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.session = self._create_session()
 
-    def generate_response(self, user_message, system_message="You are a helpful assistant", 
-                          max_tokens=512, temperature=0.7, top_p=0.7, 
-                          presence_penalty=0, stream=True):
-        payload = {
+    def _create_session(self):
+        """Keep-alive session: connections (and their TLS handshakes) are reused across calls."""
+        # A completion is not idempotent: only retry when the request never reached the server
+        # (connect errors) or was refused with a retryable status, never after a read error or timeout
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            other=0,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def _build_payload(self, user_message, system_message, max_tokens, temperature, top_p,
+                       presence_penalty, stream):
+        return {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system_message},
@@ -27,24 +65,150 @@ class LLMClient:
             "presence_penalty": presence_penalty,
             "stream": stream
         }
+
+    def generate_response(self, user_message, system_message="You are a helpful assistant",
+                          max_tokens=512, temperature=0.7, top_p=0.7,
+                          presence_penalty=0, stream=True):
+        payload = self._build_payload(user_message, system_message, max_tokens, temperature,
+                                      top_p, presence_penalty, stream)
         # print(f"Payload: {payload}")  # 调试用
+        metrics.inc("llm_requests")
+        start = time.perf_counter()
         try:
-            response = requests.post(self.api_url, headers=self.headers, data=json.dumps(payload), stream=stream)
+            response = self.session.post(self.api_url, data=json.dumps(payload), stream=stream,
+                                         timeout=self.timeout)
             # print(f"Response status code: {response.status_code}")  # 调试用
             # print(f"Response text: {response.text}")  # 调试用
             response.raise_for_status()
             if stream:
-                return self._stream_response(response)
+                return self._stream_response(response, start)
             else:
-                return self._parse_response(response)
+                content = self._parse_response(response)
+                metrics.observe("llm_generation", time.perf_counter() - start)
+                return content
         except requests.exceptions.RequestException as e:
             print(f"Request failed: {e}")
+            metrics.inc("llm_errors")
             return None
 
-    def _stream_response(self, response):
-        print("Generating response:\n")
-        for line in response.iter_lines():
-            if line:
+    def close(self):
+        self.session.close()
+
+    def _stream_response(self, response, start):
+        """
+        Yield content deltas from the server-sent event stream as they arrive, recording
+        the time to the first token and the total generation time since `start`.
+        A connection error or read timeout mid-stream is raised to the consumer.
+        """
+        first_token = True
+        try:
+            for line in response.iter_lines():
+                if line:
+                    decoded_line = line.decode('utf-8').strip()
+                    if decoded_line == "data: [DONE]":
+                        break
+                    if decoded_line.startswith("data: "):
+                        try:
+                            data = json.loads(decoded_line[len("data: "):])
+                            content = data["choices"][0]["delta"].get("content")
+                            if content:
+                                if first_token:
+                                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                                    first_token = False
+                                yield content
+                        except json.JSONDecodeError:
+                            continue
+        except requests.exceptions.RequestException as e:
+            # Re-raised so the caller can tell the answer was cut off
+            print(f"Stream interrupted: {e}")
+            metrics.inc("llm_errors")
+            raise
+        finally:
+            response.close()
+            metrics.observe("llm_generation", time.perf_counter() - start)
+
+    def _parse_response(self, response):
+        data = response.json()
+        return data.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+
+class AsyncLLMClient(LLMClient):
+    """
+    asyncio variant of LLMClient with the same interface: `await generate_response(...)`.
+    One aiohttp session (created lazily inside the running event loop) keeps up to
+    `pool_size` connections alive, so many requests can be in flight from one process.
+    """
+
+    def __init__(self, api_url, api_key, model="llama-3.1-8b-instruct", pool_size=100,
+                 timeout=(10, 120), max_retries=3, backoff_factor=0.5):
+        super().__init__(api_url, api_key, model=model, pool_size=pool_size, timeout=timeout,
+                         max_retries=max_retries, backoff_factor=backoff_factor)
+
+    def _create_session(self):
+        # aiohttp sessions must be created inside the event loop, see _get_session
+        return None
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connect_timeout, read_timeout = self.timeout
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            )
+        return self.session
+
+    async def _post(self, payload):
+        """
+        POST with retries on connect errors and retryable statuses, like LLMClient (never after the
+        request was sent). Caller releases the response.
+        """
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await session.post(self.api_url, data=json.dumps(payload))
+                if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                    response.release()
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                    continue
+                if response.status >= 400:
+                    response.release()
+                response.raise_for_status()
+                return response
+            except aiohttp.ClientConnectorError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def generate_response(self, user_message, system_message="You are a helpful assistant",
+                                max_tokens=512, temperature=0.7, top_p=0.7,
+                                presence_penalty=0, stream=True):
+        payload = self._build_payload(user_message, system_message, max_tokens, temperature,
+                                      top_p, presence_penalty, stream)
+        metrics.inc("llm_requests")
+        start = time.perf_counter()
+        try:
+            response = await self._post(payload)
+            if stream:
+                return self._stream_response(response, start)
+            else:
+                content = await self._parse_response(response)
+                metrics.observe("llm_generation", time.perf_counter() - start)
+                return content
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Request failed: {e}")
+            metrics.inc("llm_errors")
+            return None
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _stream_response(self, response, start):
+        """Async generator of content deltas from the server-sent event stream, timed like LLMClient's."""
+        first_token = True
+        try:
+            async for line in response.content:
                 decoded_line = line.decode('utf-8').strip()
                 if decoded_line == "data: [DONE]":
                     break
@@ -53,11 +217,23 @@ class LLMClient:
                         data = json.loads(decoded_line[len("data: "):])
                         content = data["choices"][0]["delta"].get("content")
                         if content:
-                            print(content, end="", flush=True)
+                            if first_token:
+                                metrics.observe("llm_first_token", time.perf_counter() - start)
+                                first_token = False
+                            yield content
                     except json.JSONDecodeError:
                         continue
-        print("\nResponse completed.")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Stream interrupted: {e}")
+            metrics.inc("llm_errors")
+            raise
+        finally:
+            response.release()
+            metrics.observe("llm_generation", time.perf_counter() - start)
 
-    def _parse_response(self, response):
-        data = response.json()
+    async def _parse_response(self, response):
+        try:
+            data = await response.json()
+        finally:
+            response.release()
         return data.get("choices", [{}])[0].get("message", {}).get("content", "")
@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from tqdm import tqdm
+import db_pool
+import recipes_schema
+
+# Offline retrieval backend: recipes_embeddings exported to a memory-mapped matrix on disk
+#
+# Layout of LOCAL_INDEX_DIR:
+#   embeddings.npy  (n, 768) L2-normalised float16/float32 matrix, opened with mmap
+#   ids.npy         (n,) int64 recipe ids, same row order as embeddings.npy
+#   recipes.jsonl   one JSON object per recipe (the `recipes` row), same row order
+#   offsets.npy     (n + 1,) byte offsets of each line in recipes.jsonl
+
+load_dotenv()
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float16")
+# Rows scored per matmul, bounds the float32 working set during a search
+SEARCH_BLOCK_ROWS = int(os.getenv("LOCAL_INDEX_BLOCK_ROWS", "65536"))
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def export_local_index(directory=LOCAL_INDEX_DIR, dtype=LOCAL_INDEX_DTYPE, batch_size=5000):
+    """Dump recipes_embeddings and the matching recipes rows into `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+
+    with db_pool.get_connection() as connection:
+        with connection.cursor() as cursor:
+            # One snapshot for the whole export, so the row count matches what gets streamed
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+            cursor.execute("SELECT COUNT(*) FROM recipes_embeddings e JOIN recipes r ON r.id = e.id;")
+            total = cursor.fetchone()[0]
+            cursor.execute("SELECT vector_dims(embedding) FROM recipes_embeddings LIMIT 1;")
+            row = cursor.fetchone()
+            dim = row[0] if row else 768
+
+        # Write to temporary names first so a running app never sees a half-written index
+        embeddings = np.lib.format.open_memmap(
+            os.path.join(directory, "embeddings.tmp.npy"), mode="w+", dtype=dtype, shape=(total, dim)
+        )
+        ids = np.empty(total, dtype=np.int64)
+        offsets = np.empty(total + 1, dtype=np.int64)
+        offsets[0] = 0
+
+        position = 0
+        with connection.cursor(name="local_index_export") as reader, \
+                open(os.path.join(directory, "recipes.tmp.jsonl"), "wb") as recipes_file, \
+                tqdm(total=total, desc="Exporting embeddings") as progress:
+            reader.itersize = batch_size
+            reader.execute("""
+            SELECT e.id, e.embedding::text, (to_jsonb(r) - %s)::text
+            FROM recipes_embeddings e
+            JOIN recipes r ON r.id = e.id
+            ORDER BY e.id;
+            """, (recipes_schema.RECIPES_SEARCH_COLUMN,))
+            while True:
+                chunk = reader.fetchmany(batch_size)
+                if not chunk:
+                    break
+                count = len(chunk)
+                vectors = np.array(
+                    [vector_text[1:-1].split(",") for _, vector_text, _ in chunk], dtype=np.float32
+                )
+                # Normalise once at export so cosine similarity is a plain dot product at query time
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                embeddings[position:position + count] = vectors
+                ids[position:position + count] = [record_id for record_id, _, _ in chunk]
+                for i, (_, _, recipe_json) in enumerate(chunk):
+                    line = recipe_json.encode("utf-8") + b"\n"
+                    recipes_file.write(line)
+                    offsets[position + i + 1] = offsets[position + i] + len(line)
+                position += count
+                progress.update(count)
+
+    embeddings.flush()
+    del embeddings
+    np.save(os.path.join(directory, "ids.tmp.npy"), ids)
+    np.save(os.path.join(directory, "offsets.tmp.npy"), offsets)
+    for name in ("embeddings.npy", "ids.npy", "offsets.npy", "recipes.jsonl"):
+        stem, extension = os.path.splitext(name)
+        os.replace(os.path.join(directory, f"{stem}.tmp{extension}"), os.path.join(directory, name))
+
+    print(f"Exported {position} embeddings ({dtype}, dim={dim}) to {directory} "
+          f"in {time.perf_counter() - start:.1f}s.")
+
+
+class LocalVectorIndex:
+    def __init__(self, directory=LOCAL_INDEX_DIR):
+        self.directory = directory
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, "ids.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.recipes_path = os.path.join(directory, "recipes.jsonl")
+
+    def search(self, query_embedding, top_k=5):
+        """Exact cosine top-k over the memory-mapped matrix. Returns (rows, scores)."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        total = len(self.ids)
+        top_k = min(top_k, total)
+        if top_k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            block = self.embeddings[start:start + SEARCH_BLOCK_ROWS]
+            # float16 blocks are upcast per block, so accumulation happens in float32
+            np.matmul(block, query, out=scores[start:start + len(block)])
+
+        # argpartition finds the top-k in O(n); only those k are fully sorted
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = candidates[np.argsort(-scores[candidates])]
+        return rows, scores[rows]
+
+    def get_recipes(self, rows):
+        """Read only the requested recipes from recipes.jsonl."""
+        recipes = []
+        with open(self.recipes_path, "rb") as recipes_file:
+            for row in rows:
+                recipes_file.seek(int(self.offsets[row]))
+                recipes.append(json.loads(recipes_file.read(int(self.offsets[row + 1] - self.offsets[row]))))
+        return recipes
+
+    def get_recipes_by_id(self, recipe_ids):
+        """Full recipe dicts for `recipe_ids`, in the given order (unknown ids are skipped)."""
+        rows = {int(self.ids[row]): row for row in np.flatnonzero(np.isin(self.ids, recipe_ids))}
+        return self.get_recipes([rows[recipe_id] for recipe_id in recipe_ids if recipe_id in rows])
+
+    def search_recipes(self, query_embedding, top_k=5):
+        """Full recipe dicts of the `top_k` nearest neighbours, like rag.similarity_search."""
+        rows, _ = self.search(query_embedding, top_k)
+        return self.get_recipes(rows)
+
+
+def get_index(directory=LOCAL_INDEX_DIR):
+    """Return the process-wide LocalVectorIndex, opening it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalVectorIndex(directory)
+                print(f"Local vector index loaded from {directory} ({len(_index.ids)} recipes).")
+    return _index
+
+
+if __name__ == "__main__":
+    export_local_index()
@@ -0,0 +1,147 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+# In-process stage timings and counters, exposed in the Prometheus text format.
+#
+#   with metrics.span("query_embedding"):
+#       ...
+#   metrics.inc("llm_requests")
+#
+# When METRICS_ENABLED is off, span() returns a shared no-op context manager and
+# observe()/inc() return immediately, so instrumented code costs one attribute lookup.
+
+load_dotenv()
+
+ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Interface /metrics listens on; set to 0.0.0.0 to let a scraper on another host reach it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Histogram buckets in seconds, from sub-millisecond SQL to multi-second LLM answers
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_histograms = {}  # stage -> [bucket counts..., +Inf count], sum
+_counters = {}  # event -> count
+_collectors = {}  # name -> callable returning {key: number}
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def span(stage):
+    """Context manager recording its duration in the `stage` histogram."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(stage)
+
+
+def observe(stage, seconds):
+    """Record one duration (seconds) in the `stage` histogram."""
+    if not ENABLED:
+        return
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][index] += 1
+        histogram[1] += seconds
+
+
+def inc(event, amount=1):
+    """Increase the `event` counter."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + amount
+
+
+def register_collector(name, collect):
+    """
+    Expose the numeric values of `collect()` (e.g. a cache's stats()) as gauges named
+    mealmate_<name>_<key>. Collectors are only called when the metrics are scraped.
+    """
+    _collectors[name] = collect
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {stage: (list(counts), total) for stage, (counts, total) in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [
+        "# HELP mealmate_stage_duration_seconds Duration of pipeline stages.",
+        "# TYPE mealmate_stage_duration_seconds histogram",
+    ]
+    for stage, (counts, total) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            lines.append(f'mealmate_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'mealmate_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+        lines.append(f'mealmate_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'mealmate_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+
+    lines += ["# HELP mealmate_events_total Counted events.", "# TYPE mealmate_events_total counter"]
+    for event, count in sorted(counters.items()):
+        lines.append(f'mealmate_events_total{{event="{event}"}} {count}')
+
+    for name, collect in sorted(_collectors.items()):
+        try:
+            values = collect()
+        except Exception as error:
+            print(f"Metrics collector {name} failed, error details:", error)
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE mealmate_{name}_{key} gauge")
+                lines.append(f"mealmate_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on `host`:`port` from a daemon thread, next to the Gradio app. No-op when disabled."""
+    if not ENABLED:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
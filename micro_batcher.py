@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Groups items submitted from many threads within `max_wait` seconds into a single
+    call of `batch_fn(items) -> results` (one result per item, same order). Every
+    caller gets its own result, or the batch's exception, back through a Future.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait=0.01, name="micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """Queue `item` for the next batch and return a Future of its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Submit `item` and block until its result is ready."""
+        return self.submit(item).result()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or max_wait elapsed."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop requests whose caller already gave up
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = list(self.batch_fn([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: batch function returned {len(results)} results "
+                                       f"for {len(batch)} items")
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -1,123 +1,280 @@
-import psycopg2
-from dotenv import load_dotenv
+import io
 import os
-from sentence_transformers import SentenceTransformer
+import time
+import numpy as np
 from tqdm import tqdm
+import db_pool
+import embedding_model
+import recipes_schema
 
 # To create structured vectorstore via PostgreDB
 
-# Load environment variables
-load_dotenv()
+# The SentenceTransformer model is loaded on first use, see embedding_model.py
 
-# Database connection parameters
-host = os.getenv("SCW_DB_HOST")
-port = os.getenv("SCW_DB_PORT")
-database = os.getenv("SCW_DB_NAME")
-user = os.getenv("SCW_DB_USER")
-password = os.getenv("SCW_DB_PASSWORD")
+# Number of descriptions the model encodes per forward pass
+ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", "64"))
 
-# Initialize the SentenceTransformer model
-model = SentenceTransformer("BAAI/bge-base-en-v1.5")
+# How embeddings are written: "copy" (binary COPY through a staging table) or "insert"
+INGEST_MODE = os.getenv("EMBEDDING_INGEST_MODE", "copy")
+# Number of ingested batches per transaction
+COMMIT_EVERY = int(os.getenv("EMBEDDING_COMMIT_EVERY", "10"))
+# Which recipes the backfill embeds:
+# - "incremental": new recipes and recipes whose description hash changed (or was never recorded),
+#   plus deleting orphaned embeddings
+# - "adopt": first stamp embeddings without a hash as up to date (see stamp_content_hashes), then "incremental"
+# - "full": every recipe, plus deleting orphaned embeddings
+# - "missing": only recipes without an embedding
+SYNC_MODES = ("incremental", "adopt", "full", "missing")
+SYNC_MODE = os.getenv("EMBEDDING_SYNC_MODE", "incremental")
 
+# ANN index on recipes_embeddings.embedding: "hnsw" or "ivfflat" (cosine distance)
+INDEX_NAME = "recipes_embeddings_embedding_idx"
+INDEX_METHOD = os.getenv("EMBEDDING_INDEX_METHOD", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
 
-def create_recipes_embeddings_table(batch_size=100):
+# Header and trailer of PostgreSQL's binary COPY format
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+COPY_BINARY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+
+def encode_descriptions(descriptions, encode_batch_size=ENCODE_BATCH_SIZE):
+    """
+    Encode a list of descriptions into a float32 matrix, one row per description in the
+    given order (SentenceTransformer.encode already groups inputs of similar length per batch).
+    """
+    return embedding_model.encode(
+        descriptions,
+        batch_size=encode_batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    ).astype(np.float32, copy=False)
+
+
+def encode_copy_binary(ids, embeddings, content_hashes):
+    """
+    Build a binary COPY payload for (id BIGINT, embedding VECTOR, content_hash TEXT) rows
+    in one vectorized pass. pgvector's binary format is int16 dim, int16 unused, then
+    dim big-endian float4 values; content hashes are 32-character md5 hex digests.
+    """
+    count, dim = embeddings.shape
+    row_type = np.dtype([
+        ("field_count", ">i2"),
+        ("id_length", ">i4"),
+        ("id", ">i8"),
+        ("vector_length", ">i4"),
+        ("dim", ">i2"),
+        ("unused", ">i2"),
+        ("values", ">f4", (dim,)),
+        ("hash_length", ">i4"),
+        ("hash", "S32"),
+    ])
+    rows = np.empty(count, dtype=row_type)
+    rows["field_count"] = 3
+    rows["id_length"] = 8
+    rows["id"] = ids
+    rows["vector_length"] = 4 + 4 * dim
+    rows["dim"] = dim
+    rows["unused"] = 0
+    rows["values"] = embeddings
+    rows["hash_length"] = 32
+    rows["hash"] = [content_hash.encode("ascii") for content_hash in content_hashes]
+    return COPY_BINARY_HEADER + rows.tobytes() + COPY_BINARY_TRAILER
+
+
+def copy_embeddings(cursor, ids, embeddings, content_hashes):
+    """
+    Stream a batch into a session-local staging table with binary COPY, then merge it
+    into `recipes_embeddings` so re-ingesting an existing id updates it instead of failing.
+    """
+    cursor.execute("""
+    CREATE TEMP TABLE IF NOT EXISTS recipes_embeddings_staging
+    (LIKE recipes_embeddings INCLUDING DEFAULTS);
+    """)
+    cursor.copy_expert(
+        "COPY recipes_embeddings_staging (id, embedding, content_hash) FROM STDIN WITH (FORMAT binary);",
+        io.BytesIO(encode_copy_binary(ids, embeddings, content_hashes)),
+    )
+    cursor.execute("""
+    INSERT INTO recipes_embeddings (id, embedding, content_hash)
+    SELECT id, embedding, content_hash FROM recipes_embeddings_staging
+    ON CONFLICT (id) DO UPDATE SET embedding = EXCLUDED.embedding, content_hash = EXCLUDED.content_hash;
+    """)
+    cursor.execute("TRUNCATE recipes_embeddings_staging;")
+
+
+def insert_embeddings(cursor, ids, embeddings, content_hashes):
+    """Row-by-row insert path, kept for comparison with the COPY path."""
+    cursor.executemany("""
+    INSERT INTO recipes_embeddings (id, embedding, content_hash)
+    VALUES (%s, %s::vector, %s)
+    ON CONFLICT (id) DO UPDATE SET embedding = EXCLUDED.embedding, content_hash = EXCLUDED.content_hash;
+    """, [(record_id, db_pool.to_vector_literal(embedding.tolist()), content_hash)
+          for record_id, embedding, content_hash in zip(ids, embeddings, content_hashes)])
+
+
+def delete_orphaned_embeddings(cursor):
+    """Delete embeddings whose recipe was deleted or lost its description. Returns the number of rows deleted."""
+    cursor.execute("""
+    DELETE FROM recipes_embeddings e
+    WHERE NOT EXISTS (
+        SELECT 1 FROM recipes r
+        WHERE r.id = e.id AND r.description IS NOT NULL AND r.description <> ''
+    );
+    """)
+    return cursor.rowcount
+
+
+def stamp_content_hashes(cursor):
+    """
+    Record the current description hash on embeddings that predate content hashes, trusting
+    them as up to date (the "adopt" sync mode). Only safe when no description was edited
+    since those embeddings were computed. Returns the number of rows stamped.
+    """
+    cursor.execute("""
+    UPDATE recipes_embeddings e
+    SET content_hash = md5(r.description)
+    FROM recipes r
+    WHERE r.id = e.id AND e.content_hash IS NULL;
+    """)
+    return cursor.rowcount
+
+
+def create_recipes_embeddings_table(batch_size=1024, encode_batch_size=ENCODE_BATCH_SIZE,
+                                    ingest_mode=INGEST_MODE, commit_every=COMMIT_EVERY, sync_mode=SYNC_MODE):
+    """
+    Create `recipes_embeddings` if needed and embed the recipes that need it (see SYNC_MODE).
+    Each embedding stores the md5 of the description it was computed from, so the
+    incremental mode only re-embeds recipes whose description changed.
+    Recipes are fetched `batch_size` at a time, rounded up to a multiple of `encode_batch_size`
+    so that every chunk is encoded in full batches (the last chunk aside).
+    """
+    if sync_mode not in SYNC_MODES:
+        print(f"Unknown sync mode {sync_mode!r}, expected one of {', '.join(SYNC_MODES)}.")
+        return
+    batch_size = -(-batch_size // encode_batch_size) * encode_batch_size
     try:
-        # Establish a database connection
-        connection = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password
-        )
-        cursor = connection.cursor()
+        # Borrow two connections from the shared pool: one streams the recipes to embed
+        # inside a single read transaction, the other writes and commits embeddings
+        with db_pool.get_connection() as read_connection, \
+                db_pool.get_connection() as connection, connection.cursor() as cursor:
+            # Ensure the pgvector extension is installed
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            print("pgvector extension ensured available.")
 
-        # Ensure the pgvector extension is installed
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        print("pgvector extension ensured available.")
+            # Create a new table `recipes_embeddings`
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recipes_embeddings (
+                id BIGINT PRIMARY KEY,
+                embedding VECTOR(768),  -- Vector type for pgvector
+                content_hash TEXT  -- md5 of the description the embedding was computed from
+            );
+            """)
+            # Embeddings created before content hashes keep a NULL hash, so "incremental" re-embeds them
+            cursor.execute("ALTER TABLE recipes_embeddings ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+            connection.commit()
+            print("Table `recipes_embeddings` created successfully or already exists.")
 
-        # Create a new table `recipes_embeddings`
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS recipes_embeddings (
-            id BIGINT PRIMARY KEY,
-            embedding VECTOR(768)  -- Vector type for pgvector
-        );
-        """)
-        print("Table `recipes_embeddings` created successfully or already exists.")
-
-        # Query data from the original table to process
-        cursor.execute("SELECT id, description FROM recipes;")
-        rows = cursor.fetchall()
-
-        # Check which embeddings already exist
-        cursor.execute("SELECT id FROM recipes_embeddings;")
-        existing_ids = {row[0] for row in cursor.fetchall()}
-
-        # Prepare data for processing
-        to_process = [(row[0], row[1]) for row in rows if row[0] not in existing_ids]
-        print(f"Number of records to process embeddings: {len(to_process)}")
-
-        # Generate embeddings in batches and insert into the database
-        batch = []
-        for record_id, description in tqdm(to_process, desc="Generating embeddings"):
-            if description:  # Ensure the description is not empty
-                embedding = model.encode(description).tolist()
-                batch.append((record_id, embedding))
-
-                # Insert every `batch_size` records
-                if len(batch) >= batch_size:
-                    cursor.executemany("""
-                    INSERT INTO recipes_embeddings (id, embedding)
-                    VALUES (%s, %s);
-                    """, batch)
-                    connection.commit()
-                    batch = []
-
-        # Insert the remaining records
-        if batch:
-            cursor.executemany("""
-            INSERT INTO recipes_embeddings (id, embedding)
-            VALUES (%s, %s);
-            """, batch)
+            if sync_mode == "adopt":
+                print(f"Stamped content hashes on {stamp_content_hashes(cursor)} existing embeddings.")
+                connection.commit()
+
+            if sync_mode != "missing":
+                deleted = delete_orphaned_embeddings(cursor)
+                connection.commit()
+                print(f"Deleted {deleted} orphaned embeddings.")
+            if sync_mode == "full":
+                missing_embeddings_sql = """
+                FROM recipes r
+                WHERE r.description IS NOT NULL AND r.description <> ''
+                """
+            elif sync_mode in ("incremental", "adopt"):
+                # Recipes with a description but no embedding, or an embedding of an older description
+                missing_embeddings_sql = """
+                FROM recipes r
+                LEFT JOIN recipes_embeddings e ON e.id = r.id
+                WHERE r.description IS NOT NULL AND r.description <> ''
+                  AND (e.id IS NULL OR e.content_hash IS DISTINCT FROM md5(r.description))
+                """
+            else:
+                # Recipes with a description but no embedding yet, resolved by the database
+                missing_embeddings_sql = """
+                FROM recipes r
+                WHERE r.description IS NOT NULL AND r.description <> ''
+                  AND NOT EXISTS (SELECT 1 FROM recipes_embeddings e WHERE e.id = r.id)
+                """
+            ingest = copy_embeddings if ingest_mode == "copy" else insert_embeddings
+            ingested_rows = 0
+            ingest_seconds = 0.0
+            pending_batches = 0
+
+            # Stream rows through a named server-side cursor, `batch_size` rows at a time,
+            # so client memory stays flat whatever the size of the table
+            with read_connection.cursor(name="recipes_embeddings_backfill") as reader, \
+                    tqdm(desc="Generating embeddings", unit="rows") as progress:
+                reader.itersize = batch_size
+                reader.execute("SELECT r.id, r.description, md5(r.description) "
+                               + missing_embeddings_sql + " ORDER BY r.id")
+                while True:
+                    chunk = reader.fetchmany(batch_size)
+                    if not chunk:
+                        break
+                    ids = [record_id for record_id, _, _ in chunk]
+                    embeddings = encode_descriptions(
+                        [description for _, description, _ in chunk],
+                        encode_batch_size=encode_batch_size,
+                    )
+
+                    ingest_start = time.perf_counter()
+                    ingest(cursor, ids, embeddings, [content_hash for _, _, content_hash in chunk])
+                    pending_batches += 1
+                    # Commit every `commit_every` batches
+                    if pending_batches >= commit_every:
+                        connection.commit()
+                        pending_batches = 0
+                    ingest_seconds += time.perf_counter() - ingest_start
+                    ingested_rows += len(ids)
+                    progress.update(len(chunk))
+
+            # Commit the remaining batches
+            ingest_start = time.perf_counter()
             connection.commit()
+            ingest_seconds += time.perf_counter() - ingest_start
 
-        print("Embedding generation and storage completed!")
+            if ingested_rows:
+                print(
+                    f"Ingested {ingested_rows} rows via {ingest_mode} in {ingest_seconds:.2f}s "
+                    f"({ingested_rows / max(ingest_seconds, 1e-9):.0f} rows/s)."
+                )
+            print("Embedding generation and storage completed!")
 
     except Exception as error:
         print("Operation failed. Error details:", error)
 
-    finally:
-        # Close the database connection
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
-        print("Database connection closed.")
-
 
 def similarity_search(query, top_k=5):
-    try:
-        # Establish a database connection
-        connection = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password
-        )
-        cursor = connection.cursor()
+    # Generate the embedding for the query
+    query_embedding = embedding_model.encode(query).tolist()
 
-        # Generate the embedding for the query
-        query_embedding = model.encode(query).tolist()
+    def search(cursor):
+        # Perform similarity search through a per-connection prepared statement
+        db_pool.execute_prepared(
+            cursor,
+            "embedding_similarity_search",
+            ["vector", "integer"],
+            """
+            SELECT id, embedding <=> $1 AS similarity
+            FROM recipes_embeddings
+            ORDER BY similarity
+            LIMIT $2
+            """,
+            (db_pool.to_vector_literal(query_embedding), top_k),
+        )
+        return cursor.fetchall()
 
-        # Perform similarity search
-        cursor.execute("""
-        SELECT id, embedding <=> %s AS similarity
-        FROM recipes_embeddings
-        ORDER BY similarity
-        LIMIT %s;
-        """, (query_embedding, top_k))
-        results = cursor.fetchall()
+    try:
+        results = db_pool.run(search)
 
         print("Similarity search results:")
         for result in results:
@@ -126,18 +283,277 @@ def similarity_search(query, top_k=5):
     except Exception as error:
         print("Similarity search failed. Error details:", error)
 
-    finally:
-        # Close the database connection
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
-        print("Database connection closed.")
+
+def embedding_index_options(cursor):
+    """
+    Access method ("hnsw" or "ivfflat") and build options (e.g. ["m=16", "ef_construction=64"])
+    of the existing ANN index on recipes_embeddings, or (None, []) when there is none.
+    """
+    cursor.execute("""
+    SELECT am.amname, coalesce(c.reloptions, '{}')
+    FROM pg_class c
+    JOIN pg_am am ON am.oid = c.relam
+    WHERE c.relname = %s AND c.relkind = 'i';
+    """, (INDEX_NAME,))
+    row = cursor.fetchone()
+    return (row[0], list(row[1])) if row else (None, [])
+
+
+def create_embedding_index(method=INDEX_METHOD, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION,
+                           lists=IVFFLAT_LISTS, maintenance_work_mem=None):
+    """
+    Create the cosine ANN index on recipes_embeddings if it does not exist yet. An existing
+    index is kept as is, whatever its method and options (see rebuild_embedding_index).
+    """
+    if method == "hnsw":
+        requested = [f"m={int(m)}", f"ef_construction={int(ef_construction)}"]
+    elif method == "ivfflat":
+        requested = [f"lists={int(lists)}"]
+    else:
+        raise ValueError("Unsupported index method. Expected 'hnsw' or 'ivfflat'.")
+    options = ", ".join(requested)
+
+    def build(cursor):
+        if maintenance_work_mem:
+            # Index builds are much faster when the graph fits in memory
+            cursor.execute("SET LOCAL maintenance_work_mem = %s;", (maintenance_work_mem,))
+        start = time.perf_counter()
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {INDEX_NAME}
+        ON recipes_embeddings USING {method} (embedding vector_cosine_ops)
+        WITH ({options});
+        """)
+        return time.perf_counter() - start, embedding_index_options(cursor)
+
+    elapsed, (actual_method, actual_options) = db_pool.run(build, retries=0)
+    actual = f"{actual_method}, {', '.join(actual_options)}"
+    print(f"Index `{INDEX_NAME}` ({actual}) ready in {elapsed:.1f}s.")
+    if (actual_method, actual_options) != (method, requested):
+        print(f"The existing index was kept instead of ({method}, {options}), "
+              f"use rebuild_embedding_index() to change it.")
+
+
+def rebuild_embedding_index(method=INDEX_METHOD, **build_options):
+    """Drop and re-create the ANN index, e.g. after a large backfill or to change parameters."""
+    db_pool.run(lambda cursor: cursor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME};"), retries=0)
+    create_embedding_index(method=method, **build_options)
+
+
+def embedding_index_report():
+    """Print and return the definition, size and usage of the indexes on recipes_embeddings."""
+    def report(cursor):
+        cursor.execute("""
+        SELECT i.indexrelname, pg_get_indexdef(i.indexrelid),
+               pg_size_pretty(pg_relation_size(i.indexrelid)), i.idx_scan
+        FROM pg_stat_user_indexes i
+        WHERE i.relname = 'recipes_embeddings';
+        """)
+        return cursor.fetchall()
+
+    rows = db_pool.run(report)
+    print("Indexes on `recipes_embeddings`:")
+    for name, definition, size, scans in rows:
+        print(f"- {name}: {size}, {scans} scans\n  {definition}")
+    return [
+        {"name": name, "definition": definition, "size": size, "scans": scans}
+        for name, definition, size, scans in rows
+    ]
+
+
+def create_recipes_text_index():
+    """
+    Add the stored tsvector column over the recipe text columns used by rag.hybrid_search,
+    and its GIN index. The column is generated by PostgreSQL, so it stays current on writes.
+    """
+    column = recipes_schema.RECIPES_SEARCH_COLUMN
+
+    def build(cursor):
+        start = time.perf_counter()
+        cursor.execute(f"""
+        ALTER TABLE recipes ADD COLUMN IF NOT EXISTS {column} tsvector
+        GENERATED ALWAYS AS ({recipes_schema.recipes_tsvector_expression()}) STORED;
+        """)
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS recipes_{column}_idx
+        ON recipes USING GIN ({column});
+        """)
+        return time.perf_counter() - start
+
+    elapsed = db_pool.run(build, retries=0)
+    print(f"Column `{column}` on {', '.join(recipes_schema.RECIPES_TEXT_COLUMNS)} and its index ready in {elapsed:.1f}s.")
+
+
+def create_recipes_filter_indexes():
+    """Create the indexes behind the dietary and cooking-time filters of rag.similarity_search."""
+    def build(cursor):
+        start = time.perf_counter()
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS recipes_tags_idx
+        ON recipes USING GIN ({recipes_schema.recipes_tags_tsvector()});
+        """)
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS recipes_minutes_idx
+        ON recipes ({recipes_schema.RECIPES_MINUTES_COLUMN});
+        """)
+        return time.perf_counter() - start
+
+    elapsed = db_pool.run(build, retries=0)
+    print(f"Filter indexes on `{recipes_schema.RECIPES_TAGS_COLUMN}` and `{recipes_schema.RECIPES_MINUTES_COLUMN}` "
+          f"ready in {elapsed:.1f}s.")
+
+
+def nearest_ids(cursor, query_vector, top_k, ef_search=None, probes=None, exact=False):
+    """Ids of the `top_k` nearest embeddings; `exact` disables the ANN index."""
+    if exact:
+        cursor.execute("SET LOCAL enable_indexscan = off;")
+    else:
+        db_pool.set_vector_search_params(cursor, ef_search=ef_search, probes=probes)
+    cursor.execute("""
+    SELECT id FROM recipes_embeddings
+    ORDER BY embedding <=> %s::vector
+    LIMIT %s;
+    """, (query_vector, top_k))
+    ids = [row[0] for row in cursor.fetchall()]
+    # Drop the SET LOCAL settings before the next query on this connection
+    cursor.connection.rollback()
+    return ids
+
+
+def recall_latency_report(sample_size=50, top_k=10, ef_search_values=(10, 20, 40, 80, 160),
+                          probes_values=(1, 5, 10, 20)):
+    """
+    Compare ANN search against exact search on a sample of stored embeddings used as
+    queries, reporting recall@k and mean latency for each ef_search (HNSW) or probes
+    (IVFFlat) setting, depending on the index that exists.
+    """
+    def measure(cursor):
+        method, _ = embedding_index_options(cursor)
+        cursor.execute("""
+        SELECT embedding::text FROM recipes_embeddings
+        ORDER BY random()
+        LIMIT %s;
+        """, (sample_size,))
+        queries = [row[0] for row in cursor.fetchall()]
+        cursor.connection.rollback()
+
+        exact_ids = []
+        exact_seconds = 0.0
+        for query_vector in queries:
+            start = time.perf_counter()
+            exact_ids.append(set(nearest_ids(cursor, query_vector, top_k, exact=True)))
+            exact_seconds += time.perf_counter() - start
+
+        report = [{"setting": "exact", "recall": 1.0, "latency_ms": 1000 * exact_seconds / len(queries)}]
+        if method == "hnsw":
+            settings = [("ef_search", value) for value in ef_search_values]
+        elif method == "ivfflat":
+            settings = [("probes", value) for value in probes_values]
+        else:
+            print(f"No ANN index `{INDEX_NAME}` on recipes_embeddings, only exact search is measured.")
+            settings = []
+        for parameter, value in settings:
+            hits = 0
+            seconds = 0.0
+            for query_vector, expected in zip(queries, exact_ids):
+                start = time.perf_counter()
+                found = nearest_ids(cursor, query_vector, top_k, **{parameter: value})
+                seconds += time.perf_counter() - start
+                hits += len(expected.intersection(found))
+            report.append({
+                "setting": f"{parameter}={value}",
+                "recall": hits / (top_k * len(queries)),
+                "latency_ms": 1000 * seconds / len(queries),
+            })
+        return report
+
+    report = db_pool.run(measure)
+    print(f"Recall@{top_k} vs latency over {sample_size} sampled queries:")
+    for row in report:
+        print(f"{row['setting']:>14}  recall={row['recall']:.3f}  latency={row['latency_ms']:.2f} ms")
+    return report
+
+
+def query_encoder_report(sample_size=200, top_k=10, backends=("int8", "onnx")):
+    """
+    Accuracy vs latency of the optional query encoder backends (see embedding_model.py)
+    against the full-precision model, on a sample of stored recipes:
+    - latency: encoding each recipe name alone, as a search query is encoded
+    - query_cosine: cosine similarity to the full-precision query embeddings
+    - stored_cosine: cosine similarity of re-encoded descriptions to the stored embeddings
+    - recall: overlap of the top-k stored embeddings retrieved for each query (within the sample)
+    """
+    def fetch(cursor):
+        cursor.execute("""
+        SELECT coalesce(r.name, ''), coalesce(r.description, ''), e.embedding::text
+        FROM recipes_embeddings e
+        JOIN recipes r ON r.id = e.id
+        ORDER BY random()
+        LIMIT %s;
+        """, (sample_size,))
+        return cursor.fetchall()
+
+    rows = db_pool.run(fetch)
+    queries = [name for name, _, _ in rows]
+    descriptions = [description for _, description, _ in rows]
+    stored = np.array([vector_text[1:-1].split(",") for _, _, vector_text in rows], dtype=np.float32)
+    stored /= np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+    top_k = min(top_k, len(rows))
+
+    def normalize(embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=-1, keepdims=True), 1e-12)
+
+    def nearest(query_embeddings):
+        return np.argsort(-(query_embeddings @ stored.T), axis=1)[:, :top_k]
+
+    report = []
+    reference_queries = None
+    reference_nearest = None
+    for backend in ("torch",) + tuple(backends):
+        try:
+            embedding_model.get_model(backend)
+        except Exception as error:
+            print(f"Skipping the {backend} encoder, error details:", error)
+            continue
+        latencies = []
+        query_embeddings = []
+        for query in queries:
+            start = time.perf_counter()
+            query_embeddings.append(embedding_model.encode(query, backend=backend))
+            latencies.append(time.perf_counter() - start)
+        query_embeddings = normalize(query_embeddings)
+        description_embeddings = normalize(embedding_model.encode(descriptions, backend=backend,
+                                                                  batch_size=ENCODE_BATCH_SIZE))
+        if reference_queries is None:
+            reference_queries = query_embeddings
+            reference_nearest = nearest(query_embeddings)
+        found = nearest(query_embeddings)
+        hits = sum(len(set(expected).intersection(row)) for expected, row in zip(reference_nearest, found))
+        report.append({
+            "backend": backend,
+            "latency_ms": 1000 * float(np.mean(latencies)),
+            "p95_latency_ms": 1000 * float(np.percentile(latencies, 95)),
+            "query_cosine": float(np.mean(np.sum(query_embeddings * reference_queries, axis=1))),
+            "stored_cosine": float(np.mean(np.sum(description_embeddings * stored, axis=1))),
+            "recall": hits / (top_k * len(queries)),
+        })
+
+    print(f"Query encoders over {len(rows)} sampled recipes (recall@{top_k} vs the full-precision model):")
+    for row in report:
+        print(f"{row['backend']:>6}  latency={row['latency_ms']:.2f} ms (p95 {row['p95_latency_ms']:.2f})  "
+              f"query_cosine={row['query_cosine']:.4f}  stored_cosine={row['stored_cosine']:.4f}  "
+              f"recall={row['recall']:.3f}")
+    return report
 
 
 # Run the script
 if __name__ == "__main__":
-    create_recipes_embeddings_table(batch_size=100)
+    create_recipes_embeddings_table()
+    # Build the ANN index after the bulk load, which is much faster than maintaining it row by row
+    create_embedding_index()
+    create_recipes_text_index()
+    create_recipes_filter_indexes()
+    embedding_index_report()
 
     # Example query
     query_text = "We have blueberry and honey at home, can you recommend us some recipes to make full use of our food at home."
@@ -1,28 +1,120 @@
-import psycopg2
 from dotenv import load_dotenv
+import atexit
 import os
-from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
-from llm_client_scaleway import LLMClient
+import re
+import threading
+import db_pool
+import embedding_model
+import local_index
+import recipes_schema
+from embedding_cache import EmbeddingCache
+from token_budget import CHARS_PER_TOKEN, estimate_tokens
+import metrics
 
 # Load environment variables
 load_dotenv()
 
-# Database connection parameters
-host = os.getenv("SCW_DB_HOST")
-port = os.getenv("SCW_DB_PORT")
-database = os.getenv("SCW_DB_NAME")
-user = os.getenv("SCW_DB_USER")
-password = os.getenv("SCW_DB_PASSWORD")
+# The SentenceTransformer model and the LLMClient are created on first use (see warm_up)
 
-# Initialize the SentenceTransformer model
-model = SentenceTransformer("BAAI/bge-base-en-v1.5")
-
-# Initialize LLMClient
-client = LLMClient(
-    api_url="https://api.scaleway.ai/e63882dd-2049-4317-a9ee-d03fc21c4ca8/v1/chat/completions",
-    api_key=os.getenv("SCW_SECRET_KEY")
+# LRU cache of query embeddings, optionally persisted so a restarted app starts warm
+query_cache = EmbeddingCache(
+    max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "86400")),
+    path=os.getenv("QUERY_CACHE_PATH") or None,
 )
+query_cache.load()
+atexit.register(query_cache.save)
+metrics.register_collector("query_cache", query_cache.stats)
+
+# Retrieval backend: "pgvector" (remote Postgres) or "local" (memory-mapped index, see local_index.py)
+RETRIEVAL_BACKEND = os.getenv("RAG_RETRIEVAL_BACKEND", "pgvector")
+
+# Default ANN search settings (None keeps the server defaults)
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "0")) or None
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "0")) or None
+
+# pgvector >= 0.8 iterative index scans keep filtered top-k complete; set empty for older versions
+ITERATIVE_SCAN = os.getenv("PGVECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+# Hybrid retrieval: keyword candidates fetched per requested result, and the reciprocal rank fusion constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))
+RRF_K = 60
+
+# Request words that say nothing about the dish, left out of free-text keyword search
+QUERY_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "are", "can", "could", "would", "should", "please",
+    "give", "want", "need", "like", "have", "some", "something", "any", "what", "which", "how", "about",
+    "make", "cook", "cooking", "using", "use", "quick", "easy", "simple", "good", "best", "nice", "tasty",
+    "recipe", "recipes", "idea", "ideas", "suggest", "recommend", "dish", "dishes", "meal", "meals", "food",
+    "home", "tonight", "today", "minutes", "min", "under", "less", "more", "than", "within",
+}
+
+# Recipe columns fetched by searches for the LLM context, full rows are fetched on demand (get_recipe_details)
+CONTEXT_COLUMNS = ["id", "name", "description"]
+# Descriptions are cut to this many characters in SQL already (0 keeps them whole)
+CONTEXT_DESCRIPTION_CHARS = int(os.getenv("RAG_CONTEXT_DESCRIPTION_CHARS", "600"))
+# Token budget of the recipes packed into the LLM prompt (see build_context)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "768"))
+
+# Dietary tags recognised in user requests, as stored in the recipes tags column
+DIET_TAGS = ["vegan", "vegetarian", "gluten-free", "low-carb", "low-fat", "low-sodium", "kosher"]
+# Ingredient words excluded by each allergy filter
+ALLERGEN_TERMS = {
+    "nuts": ["nut", "almond", "walnut", "pecan", "cashew", "hazelnut", "pistachio", "peanut", "macadamia"],
+    "peanuts": ["peanut"],
+    "dairy": ["milk", "cheese", "butter", "cream", "yogurt"],
+    "gluten": ["flour", "wheat", "barley", "rye", "couscous"],
+    "eggs": ["egg"],
+    "shellfish": ["shrimp", "prawn", "crab", "lobster", "shellfish", "scallop", "mussel", "clam", "oyster"],
+    "fish": ["fish", "salmon", "tuna", "cod", "anchovy"],
+    "soy": ["soy", "tofu", "edamame"],
+}
+# Words users write for each allergy
+ALLERGEN_ALIASES = {
+    "nut": "nuts", "nuts": "nuts", "peanut": "peanuts", "peanuts": "peanuts",
+    "dairy": "dairy", "milk": "dairy", "lactose": "dairy",
+    "gluten": "gluten", "wheat": "gluten",
+    "egg": "eggs", "eggs": "eggs",
+    "shellfish": "shellfish", "seafood": "shellfish",
+    "fish": "fish", "soy": "soy",
+}
+
+# LLM endpoint (OpenAI-compatible chat completions)
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.scaleway.ai/e63882dd-2049-4317-a9ee-d03fc21c4ca8/v1/chat/completions")
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared LLMClient, creating it (and importing its HTTP stack) on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from llm_client_scaleway import LLMClient
+                _client = LLMClient(
+                    api_url=LLM_API_URL,
+                    api_key=os.getenv("SCW_SECRET_KEY"),
+                    pool_size=int(os.getenv("LLM_POOL_SIZE", "10")),
+                    timeout=(float(os.getenv("LLM_CONNECT_TIMEOUT", "10")), float(os.getenv("LLM_READ_TIMEOUT", "120"))),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+                )
+    return _client
+
+
+def embed_query(query):
+    """Embedding of a search query, reusing it if the same prompt was seen recently."""
+    return query_cache.get_or_compute(query, embedding_model.encode_query)
+
+
+def warm_up():
+    """Load the embedding model, run one query through it and create the LLMClient, ahead of the first request."""
+    embedding_model.encode_query("warm up")
+    get_client()
+    if RETRIEVAL_BACKEND == "local":
+        local_index.get_index()
+
 
 def get_prompt(user_input, image_info):
     """
@@ -41,64 +133,386 @@ def get_prompt(user_input, image_info):
         return ""
     return prompt + final_checking
 
-def similarity_search(query, top_k=5):
+def recipe_projection(alias="r"):
+    """SELECT list of the CONTEXT_COLUMNS, used instead of `r.*` by every search."""
+    columns = []
+    for column in CONTEXT_COLUMNS:
+        if column == "description" and CONTEXT_DESCRIPTION_CHARS:
+            columns.append(f"left({alias}.description, {CONTEXT_DESCRIPTION_CHARS}) AS description")
+        else:
+            columns.append(f"{alias}.{column}")
+    return ", ".join(columns)
+
+
+def project_recipe(record):
+    """Apply recipe_projection to a full recipe dict (used for the local backend)."""
+    projected = {column: record.get(column) for column in CONTEXT_COLUMNS}
+    if CONTEXT_DESCRIPTION_CHARS and projected.get("description"):
+        projected["description"] = projected["description"][:CONTEXT_DESCRIPTION_CHARS]
+    return projected
+
+
+def rows_to_dicts(cursor):
+    """Fetch the cursor's rows as {column: value} dicts."""
+    results = cursor.fetchall()
+
+    # Get column names
+    column_names = [desc[0] for desc in cursor.description]
+
+    # Format results into a readable context
+    formatted_results = []
+    with metrics.span("row_formatting"):
+        for row in results:
+            record = {column: value for column, value in zip(column_names, row)}
+            formatted_results.append(record)
+
+    return formatted_results
+
+def parse_filters(text):
     """
-    Perform similarity search on the recipes_embeddings table based on the query,
-    and return the corresponding full content from the recipes table.
+    Extract structured filters (see compile_filters) from a free-text request,
+    e.g. "vegan dinner without nuts in under 30 minutes".
     """
+    text = (text or "").lower()
+    filters = {}
+    diets = [tag for tag in DIET_TAGS if re.search(r"\b" + tag.replace("-", "[- ]") + r"\b", text)]
+    if diets:
+        filters["diets"] = diets
+    words = re.findall(r"\b(?:no|without|avoid|allergic to|free of)\s+(\w+)", text)
+    # "gluten-free" is already a diet tag, other "X-free" words are excluded like "no X"
+    words += [word for word in re.findall(r"\b(\w+)[- ]free\b", text) if f"{word}-free" not in diets]
+    allergies = sorted({ALLERGEN_ALIASES[word] for word in words if word in ALLERGEN_ALIASES})
+    if allergies:
+        filters["allergies"] = allergies
+    # Other excluded words are taken as ingredients, e.g. "without mushrooms"
+    ingredients = [word for word in dict.fromkeys(words)
+                   if word not in ALLERGEN_ALIASES and word.isalpha() and len(word) >= 3
+                   and word not in QUERY_STOPWORDS]
+    if ingredients:
+        filters["exclude_ingredients"] = ingredients
+    minutes = re.search(r"\b(?:under|less than|within|in)\s+(\d+)\s*(?:min|minutes)\b", text)
+    if minutes:
+        filters["max_minutes"] = int(minutes.group(1))
+    return filters
+
+
+def compile_filters(filters, alias="r"):
+    """
+    Compile structured filters into SQL predicates on `recipes`. Diet tags and cooking time
+    can use its indexes (see postgreConnect.create_recipes_filter_indexes); exclusions are
+    negated full-text matches, which a GIN index cannot serve, so they are checked on each
+    candidate row.
+    - "diets": tags every recipe must carry, e.g. ["vegan", "gluten-free"]
+    - "allergies": allergen groups to exclude, e.g. ["nuts"] (see ALLERGEN_TERMS)
+    - "exclude_ingredients": further ingredients to exclude
+    - "max_minutes": longest acceptable cooking time
+    Returns (sql, params), sql being "TRUE" when there is nothing to filter.
+    """
+    filters = filters or {}
+    predicates = []
+    params = []
+    tags = recipes_schema.recipes_tags_tsvector(alias)
+    for diet in filters.get("diets", []):
+        predicates.append(f"{tags} @@ plainto_tsquery('simple', %s)")
+        params.append(diet)
+
+    excluded = [term for allergy in filters.get("allergies", []) for term in ALLERGEN_TERMS.get(allergy, [allergy])]
+    tsquery = to_tsquery_text(excluded + list(filters.get("exclude_ingredients", [])))
+    if tsquery:
+        predicates.append(f"NOT ({recipes_schema.recipes_tsvector(alias)} @@ to_tsquery('english', %s))")
+        params.append(tsquery)
+
+    if filters.get("max_minutes"):
+        predicates.append(f"{alias}.{recipes_schema.RECIPES_MINUTES_COLUMN} <= %s")
+        params.append(int(filters["max_minutes"]))
+    return " AND ".join(predicates) or "TRUE", params
+
+
+def similarity_search(query, top_k=5, ef_search=HNSW_EF_SEARCH, probes=IVFFLAT_PROBES, filters=None):
+    """
+    Perform similarity search on the recipes_embeddings table based on the query, and return
+    the id, name and (shortened, see CONTEXT_DESCRIPTION_CHARS) description of the closest recipes.
+    `ef_search` / `probes` trade recall for latency on HNSW / IVFFlat indexes.
+    `filters` (see compile_filters) are applied in the same query as the vector ordering,
+    with pgvector iterative index scans so the filtered top-k is still complete.
+    """
+    # Generate the embedding for the query, reusing it if the same prompt was seen recently
+    with metrics.span("query_embedding"):
+        query_embedding = embed_query(query)
+
+    if RETRIEVAL_BACKEND == "local":
+        if filters:
+            print("The local retrieval backend does not support filters, ignoring:", filters)
+        try:
+            with metrics.span("local_search"):
+                recipes = local_index.get_index().search_recipes(query_embedding, top_k)
+            return [project_recipe(record) for record in recipes]
+        except Exception as error:
+            print("Local similarity search failed, error details:", error)
+            return []
+
+    where, params = compile_filters(filters)
+    if where != "TRUE":
+        def search(cursor):
+            db_pool.set_vector_search_params(cursor, ef_search=ef_search, probes=probes)
+            if ITERATIVE_SCAN:
+                # Keep scanning the index until enough rows pass the WHERE clause
+                cursor.execute("SET LOCAL hnsw.iterative_scan = %s;", (ITERATIVE_SCAN,))
+                cursor.execute("SET LOCAL ivfflat.iterative_scan = 'relaxed_order';")
+            # Iterative scans may return rows slightly out of order, so re-sort the candidates
+            cursor.execute(f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT {recipe_projection()}, e.embedding <=> %s::vector AS distance
+                FROM recipes_embeddings e
+                JOIN recipes r ON e.id = r.id
+                WHERE {where}
+                ORDER BY distance
+                LIMIT %s
+            )
+            SELECT * FROM candidates ORDER BY distance;
+            """, (db_pool.to_vector_literal(query_embedding.tolist()), *params, top_k))
+            records = rows_to_dicts(cursor)
+            for record in records:
+                record.pop("distance")
+            return records
+
+        try:
+            with metrics.span("sql_similarity_search"):
+                return db_pool.run(search)
+        except Exception as error:
+            print("Filtered similarity search failed, error details:", error)
+            return []
+
+    def search(cursor):
+        db_pool.set_vector_search_params(cursor, ef_search=ef_search, probes=probes)
+        # Prepared once per pooled connection, then reused by every search
+        db_pool.execute_prepared(
+            cursor,
+            "rag_similarity_search",
+            ["vector", "integer"],
+            f"""
+            SELECT {recipe_projection()}
+            FROM recipes_embeddings e
+            JOIN recipes r ON e.id = r.id
+            ORDER BY e.embedding <=> $1
+            LIMIT $2
+            """,
+            (db_pool.to_vector_literal(query_embedding.tolist()), top_k),
+        )
+        return rows_to_dicts(cursor)
+
     try:
-        # Create a database connection
-        connection = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password
+        with metrics.span("sql_similarity_search"):
+            return db_pool.run(search)
+    except Exception as error:
+        print("Similarity search failed, error details:", error)
+        return []
+
+
+def content_terms(text):
+    """
+    Words of a free-text request worth matching against recipe text: stopwords,
+    numbers and excluded ingredients ("no nuts", "dairy-free") are left out.
+    """
+    text = re.sub(r"\b(?:no|without|avoid|allergic to|free of)\s+\w+|\b\w+[- ]free\b", " ", (text or "").lower())
+    diet_words = {word for tag in DIET_TAGS for word in tag.split("-")}
+    return [word for word in dict.fromkeys(re.findall(r"[a-z]{3,}", text))
+            if word not in QUERY_STOPWORDS and word not in diet_words]
+
+
+def to_tsquery_text(terms):
+    """OR of the given terms for to_tsquery (words within a term are ANDed), keeping only plain words."""
+    clauses = []
+    for term in terms:
+        words = re.findall(r"[a-z0-9]+", term.lower())
+        if words:
+            clauses.append("(" + " & ".join(words) + ")")
+    return " | ".join(clauses)
+
+
+def keyword_search(terms, top_k=5, filters=None):
+    """
+    Full-text search on the recipes GIN index (see postgreConnect.create_recipes_text_index):
+    recipes matching any of `terms` and `filters`, best ts_rank_cd first.
+    """
+    tsquery = to_tsquery_text(terms)
+    if not tsquery:
+        return []
+    document = recipes_schema.recipes_tsvector("r")
+    where, params = compile_filters(filters)
+
+    def search(cursor):
+        cursor.execute(f"""
+        SELECT {recipe_projection()}
+        FROM recipes r, to_tsquery('english', %s) q
+        WHERE {document} @@ q AND {where}
+        ORDER BY ts_rank_cd({document}, q) DESC
+        LIMIT %s;
+        """, (tsquery, *params, top_k))
+        return rows_to_dicts(cursor)
+
+    try:
+        with metrics.span("sql_keyword_search"):
+            return db_pool.run(search)
+    except Exception as error:
+        print("Keyword search failed, error details:", error)
+        return []
+
+
+def ingredient_search(ingredients, query_embedding, top_k=5, filters=None):
+    """
+    Recipes matching `filters` and containing the most of `ingredients` according to the GIN index. The
+    top_k * HYBRID_CANDIDATES recipes matching the most ingredients (best ts_rank_cd among equals)
+    are kept, then ordered by matched ingredients and distance to `query_embedding`,
+    so the vector distance is only computed for those candidates.
+    """
+    clauses = [clause for clause in (to_tsquery_text([ingredient]) for ingredient in ingredients) if clause]
+    if not clauses:
+        return []
+    document = recipes_schema.recipes_tsvector("r")
+    matched_count = " + ".join([f"({document} @@ to_tsquery('english', %s))::int"] * len(clauses))
+    where, params = compile_filters(filters)
+
+    def search(cursor):
+        cursor.execute(f"""
+        WITH candidates AS (
+            SELECT r.id, {matched_count} AS matched
+            FROM recipes r, to_tsquery('english', %s) q
+            WHERE {document} @@ q AND {where}
+            ORDER BY matched DESC, ts_rank_cd({document}, q) DESC
+            LIMIT %s
         )
-        cursor = connection.cursor()
-
-        # Generate the embedding for the query
-        query_embedding = model.encode(query).tolist()
-
-        # Convert the embedding into PostgreSQL array format
-        query_embedding_str = f"ARRAY{query_embedding}"
-        # Use SQL parameterization to avoid syntax issues
-        sql_query = f"""
-        SELECT r.*
-        FROM recipes_embeddings e
-        JOIN recipes r ON e.id = r.id
-        ORDER BY e.embedding <=> %s::VECTOR
+        SELECT {recipe_projection()}
+        FROM candidates c
+        JOIN recipes r ON r.id = c.id
+        JOIN recipes_embeddings e ON e.id = c.id
+        ORDER BY c.matched DESC, e.embedding <=> %s::vector
         LIMIT %s;
-        """
-        cursor.execute(sql_query, (query_embedding, top_k))
-        results = cursor.fetchall()
+        """, (*clauses, " | ".join(clauses), *params, top_k * HYBRID_CANDIDATES,
+              db_pool.to_vector_literal(query_embedding.tolist()), top_k))
+        return rows_to_dicts(cursor)
 
-        # Get column names
-        column_names = [desc[0] for desc in cursor.description]
+    try:
+        with metrics.span("sql_ingredient_search"):
+            return db_pool.run(search)
+    except Exception as error:
+        print("Ingredient search failed, error details:", error)
+        return []
+
+
+def fuse_rankings(*ranked_lists, weights=None, top_k=5):
+    """Reciprocal rank fusion of several ranked recipe lists, keyed on recipe id."""
+    weights = weights or [1.0] * len(ranked_lists)
+    scores = {}
+    records = {}
+    for results, weight in zip(ranked_lists, weights):
+        for rank, record in enumerate(results):
+            scores[record["id"]] = scores.get(record["id"], 0.0) + weight / (RRF_K + rank + 1)
+            records.setdefault(record["id"], record)
+    ranked_ids = sorted(scores, key=scores.get, reverse=True)
+    return [records[record_id] for record_id in ranked_ids[:top_k]]
 
-        # Format results into a readable context
-        formatted_results = []
-        for row in results:
-            record = {column: value for column, value in zip(column_names, row)}
-            formatted_results.append(record)
 
-        return formatted_results
+def hybrid_search(query, ingredients=None, top_k=5, filters=None):
+    """
+    Ingredient-aware retrieval combining the full-text index with vector search,
+    every stage restricted to recipes matching `filters` (see compile_filters).
+    - With `ingredients`, recipes sharing the most ingredients are returned, dense similarity
+      to `query` only breaking ties and filling up when too few recipes match.
+    - Otherwise keyword and dense results for `query` are merged by reciprocal rank fusion.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        # The local backend has no full-text index nor filter columns, fall back to dense search
+        # (which warns about the filters it ignores)
+        return similarity_search(query, top_k, filters=filters)
+
+    if ingredients:
+        results = ingredient_search(ingredients, embed_query(query), top_k, filters)
+        if len(results) < top_k:
+            found_ids = {record["id"] for record in results}
+            results += [record for record in similarity_search(query, top_k, filters=filters)
+                        if record["id"] not in found_ids]
+        return results[:top_k]
+
+    candidates = top_k * HYBRID_CANDIDATES
+    return fuse_rankings(
+        keyword_search(content_terms(query), candidates, filters),
+        similarity_search(query, candidates, filters=filters),
+        top_k=top_k,
+    )
+
+
+def merge_results(*result_lists, top_k=5):
+    """
+    Merge several ranked recipe lists into one, taking results round-robin so each
+    source keeps its best hits, and dropping duplicate recipe ids.
+    """
+    merged = []
+    seen_ids = set()
+    for rank in range(max((len(results) for results in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results) and results[rank]["id"] not in seen_ids:
+                seen_ids.add(results[rank]["id"])
+                merged.append(results[rank])
+    return merged[:top_k]
+
+
+def get_recipe_details(recipe_ids):
+    """Full recipe rows (every column) for `recipe_ids`, in the given order, fetched only when asked for."""
+    if not recipe_ids:
+        return []
+    if RETRIEVAL_BACKEND == "local":
+        return local_index.get_index().get_recipes_by_id(list(recipe_ids))
+
+    def fetch(cursor):
+        cursor.execute("SELECT r.* FROM recipes r WHERE r.id = ANY(%s);", (list(recipe_ids),))
+        records = {}
+        for record in rows_to_dicts(cursor):
+            record.pop(recipes_schema.RECIPES_SEARCH_COLUMN, None)
+            records[record["id"]] = record
+        return [records[recipe_id] for recipe_id in recipe_ids if recipe_id in records]
 
+    try:
+        with metrics.span("sql_get_recipe_details"):
+            return db_pool.run(fetch)
     except Exception as error:
-        print("Similarity search failed, error details:", error)
+        print("Fetching recipe details failed, error details:", error)
         return []
 
-    finally:
-        # Close the connection
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+def format_context(search_results):
+    """Format search results into strings for LLM context."""
+    return [
+        f"Recipe ID: {res['id']}, Name: {res['name']}, Description: {res['description']}"
+        for res in search_results
+    ]
 
 
-def ask_question_with_context(question, context):
+def build_context(search_results, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    format_context limited to `token_budget` tokens: recipes are packed best first, and the
+    first one that does not fit whole gets its description shortened to the remaining budget.
+    """
+    context = []
+    used = 0
+    for entry, res in zip(format_context(search_results), search_results):
+        tokens = estimate_tokens(entry)
+        if used + tokens > token_budget:
+            # Shorten the description rather than drop the recipe, if a useful part of it fits
+            overflow_chars = (used + tokens - token_budget) * CHARS_PER_TOKEN
+            description = res.get("description") or ""
+            if len(description) - overflow_chars >= 80:
+                context.append(entry[:len(entry) - overflow_chars].rstrip() + "...")
+            break
+        context.append(entry)
+        used += tokens
+    return context
+
+
+def ask_question_with_context(question, context, stream=False):
     """
     Ask LLM a question with a given context using LLMClient.
+    With `stream=True` a generator of content deltas is returned instead of the full answer.
     """
     # Combine the question with the context
     context_text = "\n".join([f"- {item}" for item in context])
@@ -109,8 +523,9 @@ def ask_question_with_context(question, context):
     )
 
     print(f"Asking LLMClient with message:\n{full_message}")
-    response = client.generate_response(user_message=full_message, stream=False)
-    print("Response:", response)
+    response = get_client().generate_response(user_message=full_message, stream=stream)
+    if not stream:
+        print("Response:", response)
     return response
 
 
@@ -120,10 +535,7 @@ if __name__ == "__main__":
     search_results = similarity_search(query_text, top_k=5)
 
     # Format results into strings for LLM context
-    formatted_context = [
-        f"Recipe ID: {res['id']}, Name: {res['name']}, Description: {res['description']}"
-        for res in search_results
-    ]
+    formatted_context = format_context(search_results)
 
     # Ask the LLMClient API with the context
     question = "Can you suggest the most nutritious option among these recipes?"
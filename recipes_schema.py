@@ -0,0 +1,37 @@
+import os
+from dotenv import load_dotenv
+
+# Columns of the `recipes` table behind full-text matching and filters, and the SQL
+# expressions over them shared by rag.py (queries), postgreConnect.py (indexes) and local_index.py
+
+load_dotenv()
+
+# Text columns of `recipes` covered by the full-text (GIN) index used for ingredient matching
+RECIPES_TEXT_COLUMNS = [column.strip() for column in os.getenv("RECIPES_TEXT_COLUMNS", "name,ingredients").split(",")]
+# Stored tsvector column of `recipes` generated from RECIPES_TEXT_COLUMNS (see postgreConnect.create_recipes_text_index)
+RECIPES_SEARCH_COLUMN = "search_document"
+# Columns of `recipes` holding dietary tags (e.g. 'vegan', 'gluten-free') and the cooking time in minutes
+RECIPES_TAGS_COLUMN = os.getenv("RECIPES_TAGS_COLUMN", "tags")
+RECIPES_MINUTES_COLUMN = os.getenv("RECIPES_MINUTES_COLUMN", "minutes")
+
+
+def recipes_tsvector_expression():
+    """The expression RECIPES_SEARCH_COLUMN is generated from."""
+    return "to_tsvector('english', " + " || ' ' || ".join(
+        f"coalesce({column}, '')" for column in RECIPES_TEXT_COLUMNS
+    ) + ")"
+
+
+def recipes_tsvector(alias=""):
+    """
+    The stored tsvector of the recipes full-text index: computed once per row when it is
+    written, so matching and ranking never re-parse the recipe text.
+    """
+    prefix = f"{alias}." if alias else ""
+    return f"{prefix}{RECIPES_SEARCH_COLUMN}"
+
+
+def recipes_tags_tsvector(alias=""):
+    """The tsvector expression of the recipes tags index, used for dietary filters."""
+    prefix = f"{alias}." if alias else ""
+    return f"to_tsvector('simple', coalesce({prefix}{RECIPES_TAGS_COLUMN}, ''))"
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """
+    Thread-safe, bounded per-session chat history.
+    - Sessions idle for more than `ttl` seconds are dropped.
+    - At most `max_sessions` sessions are kept; the least recently used go first.
+    - `max_chars` caps the total content stored across sessions, and
+      `max_session_chars` the content of one session (its oldest turns go first, a turn
+      being a user message and the replies that follow it).
+    Only the role and text content of messages are stored.
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600, max_chars=20_000_000, max_session_chars=200_000):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.max_session_chars = max_session_chars
+        self.evictions = 0
+        self._sessions = OrderedDict()  # session_id -> {"messages", "chars", "last_seen"}
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        """Return a copy of the session's messages (oldest first)."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            session["last_seen"] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return list(session["messages"])
+
+    def append(self, session_id, *messages):
+        with self._lock:
+            self._expire()
+            session = self._sessions.setdefault(session_id, {"messages": [], "chars": 0, "last_seen": 0.0})
+            for message in messages:
+                content = message.get("content") or ""
+                session["messages"].append({"role": message["role"], "content": content})
+                session["chars"] += len(content)
+                self._total_chars += len(content)
+            # Per-session cap: forget the oldest turns of very long conversations, whole
+            while session["chars"] > self.max_session_chars and len(session["messages"]) > 1:
+                self._drop_first_message(session)
+                while session["messages"] and session["messages"][0]["role"] != "user":
+                    self._drop_first_message(session)
+            session["last_seen"] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions
+                                               or self._total_chars > self.max_chars):
+                self._evict_oldest()
+
+    def clear(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_chars -= session["chars"]
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "chars": self._total_chars,
+            "evictions": self.evictions,
+        }
+
+    def _expire(self):
+        # Sessions are kept in last-used order, so expired ones are at the front
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest["last_seen"] <= self.ttl:
+                break
+            self._evict_oldest()
+
+    def _drop_first_message(self, session):
+        dropped = len(session["messages"].pop(0)["content"])
+        session["chars"] -= dropped
+        self._total_chars -= dropped
+
+    def _evict_oldest(self):
+        _, session = self._sessions.popitem(last=False)
+        self._total_chars -= session["chars"]
+        self.evictions += 1
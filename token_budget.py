@@ -0,0 +1,31 @@
+# Rough token accounting for prompt budgets. Llama tokenizers average about four
+# characters of English text per token; erring on the high side keeps prompts in budget.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Approximate number of tokens in `text`."""
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def trim_to_budget(messages, token_budget):
+    """
+    Keep the most recent chat turns (a user message and the replies that follow it) whose
+    combined content fits in `token_budget` tokens, in their original order. Turns are kept
+    or dropped whole, so the history never starts with an orphan assistant message.
+    """
+    turns = []
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    kept = []
+    used = 0
+    for turn in reversed(turns):
+        tokens = sum(estimate_tokens(message["content"]) for message in turn)
+        if turn[0]["role"] != "user" or used + tokens > token_budget:
+            break
+        kept.append(turn)
+        used += tokens
+    return [message for turn in reversed(kept) for message in turn]